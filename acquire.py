@@ -0,0 +1,233 @@
+"""
+Punto de entrada único de la adquisición: monta fuente, etapas y sumideros a
+partir de un fichero de configuración JSON (ver config.example.json).
+
+Cada componente se indica por su "type"; el módulo que lo implementa solo se
+importa si aparece en la configuración, de modo que, por ejemplo, una
+configuración sin ThingsBoard no carga requests y una sin análisis no carga
+multiprocessing. El resto de claves se pasan tal cual al constructor.
+
+Si la fuente BITalino no indica "channels" (o pone "auto") solo se adquieren
+los canales analógicos que leen las etapas y sumideros configurados.
+
+Uso:
+    python acquire.py config.json
+
+Para ejecutarlo como servicio ver el README (systemd con Restart=always).
+"""
+
+import importlib
+import json
+import signal
+import sys
+from datetime import timedelta
+
+from pipeline import CHANNEL_NAMES
+
+SOURCES = {
+    "bitalino": "sources:BITalinoSource",
+    "replay": "replay:ReplaySource",
+}
+
+STAGES = {
+    "emg_filter": "emg_filters:EMGFilterStage",
+    "detector": "detector:DetectorStage",
+    "spectral": "spectral:SpectralStage",
+    "analysis": "analysis_pool:AnalysisStage",
+}
+
+SINKS = {
+    "csv": "sinks:CsvSink",
+    "binary": "sinks:BinarySink",
+    "telemetry": "sinks:TelemetrySink",
+    "events": "sinks:EventSink",
+    "live": "live_ring:LiveRingSink",
+    "catalog": "catalog:CatalogSink",
+    "analysis": "sinks:AnalysisSink",
+}
+
+# Sumideros que suben a ThingsBoard a través del outbox
+OUTBOX_SINKS = ("telemetry", "events")
+
+
+def load(target):
+    """Importa 'modulo:Nombre' solo cuando se necesita."""
+    module, name = target.split(":")
+    return getattr(importlib.import_module(module), name)
+
+
+def lookup(registry, options, kind):
+    options = dict(options)
+    kind_name = options.pop("type")
+    if kind_name not in registry:
+        raise ValueError("Unknown %s type %r (expected one of %s)" % (kind, kind_name, ", ".join(registry)))
+    return kind_name, load(registry[kind_name]), options
+
+
+def build_source(options, wanted):
+    name, cls, kwargs = lookup(SOURCES, options, "source")
+    if name == "bitalino" and kwargs.get("channels", "auto") == "auto":
+        # Solo se adquieren los canales que usan etapas y sumideros: tramas más cortas
+        kwargs["channels"] = wanted or list(range(len(CHANNEL_NAMES)))
+    return cls(**kwargs)
+
+
+def with_latency_target(build):
+    """Cualquier etapa o sumidero admite "latency_target" (s) para el tamaño de bloque adaptativo."""
+    def wrapper(options, *args):
+        options = dict(options)
+        target = options.pop("latency_target", None)
+        component = build(options, *args)
+        if target is not None:
+            component.latency_target = target
+        return component
+    return wrapper
+
+
+@with_latency_target
+def build_stage(options, sampling_rate, n_samples):
+    name, cls, kwargs = lookup(STAGES, options, "stage")
+    if name == "analysis":
+        # El pool de procesos recibe la función de análisis como 'modulo:funcion'
+        pool_class = load("analysis_pool:AnalysisPool")
+        func = load(kwargs.pop("function", "analysis_pool:block_statistics"))
+        kwargs.setdefault("max_samples", n_samples)
+        return cls(pool_class(func, **kwargs))
+    kwargs.setdefault("sampling_rate", sampling_rate)
+    return cls(**kwargs)
+
+
+@with_latency_target
+def build_sink(options, outbox, built):
+    name, cls, kwargs = lookup(SINKS, options, "sink")
+    if "recorder" in kwargs:
+        # El catálogo sigue los ficheros de un sumidero anterior: "recorder": "csv"
+        if kwargs["recorder"] not in built:
+            raise ValueError("Sink %r needs a %r sink before it" % (name, kwargs["recorder"]))
+        kwargs["recorder"] = built[kwargs["recorder"]]
+    if "rotate_minutes" in kwargs:
+        kwargs["rotate"] = timedelta(minutes=kwargs.pop("rotate_minutes"))
+    if name in OUTBOX_SINKS:
+        # EventSink admite "upload": false para solo guardar los episodios en fichero
+        upload = kwargs.pop("upload", True)
+        if upload and outbox is None:
+            raise ValueError("Sink %r needs a 'thingsboard' section in the config" % name)
+        return cls(outbox if upload else None, **kwargs)
+    return cls(**kwargs)
+
+
+def build(config):
+    """Output: (pipeline, source, uploader o None, outbox o None)"""
+    from pipeline import Pipeline, subscribed_channels
+
+    source_options = config["source"]
+    sampling_rate = source_options.get("sampling_rate", 1000)
+    n_samples = config.get("n_samples", 1000)
+
+    profiler = None
+    if config.get("profiling"):
+        from profiling import Profiler
+
+        profiler = Profiler(**config["profiling"])
+        profiler.install_signal()
+
+    outbox = uploader = None
+    thingsboard = config.get("thingsboard")
+    if thingsboard:
+        import thingsboard as thingsboard_module
+        from outbox import Outbox, OutboxUploader
+
+        thingsboard = dict(thingsboard)
+        if "url" in thingsboard:
+            thingsboard_module.THINGSBOARD_URL = thingsboard.pop("url")
+        outbox = Outbox(thingsboard.pop("outbox", "outbox.db"))
+        uploader = OutboxUploader(outbox, thingsboard.pop("device_token"), profiler=profiler, **thingsboard)
+
+    stages = [build_stage(options, sampling_rate, n_samples) for options in config.get("stages", [])]
+    sinks, built = [], {}
+    for options in config.get("sinks", []):
+        sinks.append(build_sink(options, outbox, built))
+        built.setdefault(options["type"], sinks[-1])
+    feedback = []
+    if config.get("biofeedback"):
+        # Disparo de una salida digital al apretar (ver biofeedback.py); evalúa sub-bloques
+        Biofeedback = load("biofeedback:Biofeedback")
+        options = dict(config["biofeedback"])
+        sub_block = options.pop("sub_block", 20)
+        options.setdefault("sampling_rate", sampling_rate)
+        feedback.append(Biofeedback(**options))
+    source = build_source(source_options, subscribed_channels(stages + sinks + feedback))
+    if source_options["type"] == "replay":
+        # ReplaySource numera las muestras seguidas: el catálogo no puede contar tramas perdidas
+        for sink in sinks:
+            if hasattr(sink, "sequence"):
+                sink.sequence = False
+    for listener in feedback:
+        # Con ReplaySource no hay salidas: solo se mide cuándo se habría disparado
+        listener.target = source if hasattr(source, "trigger") else None
+    print("Canales adquiridos:", ", ".join(CHANNEL_NAMES[c] for c in source.analogChannels))
+    block_size = None
+    if config.get("adaptive"):
+        # n_samples pasa a ser el tamaño máximo; ver adaptive.py
+        from adaptive import AdaptiveBlockSize
+
+        options = dict(config["adaptive"])
+        # Los buffers (p. ej. los del pool de análisis) se dimensionan con n_samples: no se puede pasar
+        if options.get("max_samples", n_samples) > n_samples:
+            print("adaptive.max_samples se limita a n_samples (%d)" % n_samples)
+        options["max_samples"] = min(options.get("max_samples", n_samples), n_samples)
+        block_size = AdaptiveBlockSize(sampling_rate=sampling_rate, **options)
+    pipeline = Pipeline(source, sampling_rate, n_samples, source.analogChannels, stages=stages, sinks=sinks,
+                        max_blocks=config.get("max_blocks", 600), profiler=profiler, listeners=feedback,
+                        sub_block=sub_block if feedback else 20, block_size=block_size)
+    return pipeline, source, uploader, outbox
+
+
+def stop_on_sigterm(signum, frame):
+    # systemd para el servicio con SIGTERM: se trata igual que Ctrl+C
+    raise KeyboardInterrupt
+
+
+def main(argv=None):
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Adquisición BITalino configurable")
+    parser.add_argument("config", help="fichero JSON con fuente, etapas y sumideros")
+    args = parser.parse_args(argv)
+
+    with open(args.config) as file:
+        config = json.load(file)
+    pipeline, source, uploader, outbox = build(config)
+    signal.signal(signal.SIGTERM, stop_on_sigterm)
+
+    if uploader is not None:
+        uploader.start()
+    pipeline.start()
+    interval = config.get("metrics_interval")
+    try:
+        if interval:
+            # Una línea JSON de métricas (tamaño de bloque, cola, latencia) cada `metrics_interval` s
+            while pipeline.process_thread.is_alive():
+                pipeline.join(interval)
+                print("Metrics:", json.dumps(pipeline.metrics()))
+        else:
+            pipeline.join()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        # Al cerrar la fuente el lector sale del read; el proceso vacía la cola y cierra los ficheros
+        pipeline.stop()
+        source.close()
+        pipeline.join(10)
+        if uploader is not None:
+            uploader.stop()
+            uploader.join(5)
+        if outbox is not None:
+            outbox.close()
+        for listener in pipeline.listeners:
+            print("Biofeedback:", json.dumps(listener.stats()))
+        print("Acquisition stopped and device closed")
+
+
+if __name__ == '__main__':
+    sys.exit(main())
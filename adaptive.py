@@ -0,0 +1,96 @@
+"""
+Tamaño de bloque adaptativo para el Pipeline.
+
+Con bloques fijos de 1000 muestras a 1000 Hz todo consumidor ve al menos un
+segundo de retraso; con bloques fijos pequeños se multiplica el coste fijo
+por bloque de `read`, la cola y los sumideros. AdaptiveBlockSize elige antes
+de cada lectura un tamaño entre `min_samples` y `max_samples`:
+
+- Un modelo coste(n) = fijo + n * por_muestra, ajustado con lo que tarda el
+  proceso de cada bloque, da el tamaño mínimo para que el proceso no ocupe
+  más de `max_utilization` del tiempo real.
+- Si hay consumidores con objetivo de latencia (atributo `latency_target` en
+  segundos de etapas y sumideros), el tamaño máximo que lo cumple contando la
+  espera del bloque en llenarse, lo que haya en cola y el coste del proceso.
+- Si la cola acumula más de `backlog_blocks` bloques, se dobla el tamaño
+  (hasta `max_samples`) para recuperar a máximo rendimiento.
+
+Sin objetivos de latencia se usan bloques de `max_samples`. El tamaño elegido
+y la latencia medida se consultan con Pipeline.metrics().
+"""
+
+import threading
+
+
+class AdaptiveBlockSize:
+
+    def __init__(self, min_samples=20, max_samples=1000, sampling_rate=1000, max_utilization=0.5,
+                 backlog_blocks=2, step=10, smoothing=0.1):
+        self.min_samples = min_samples
+        self.max_samples = max_samples
+        self.sampling_rate = float(sampling_rate)
+        self.max_utilization = max_utilization
+        self.backlog_blocks = backlog_blocks
+        self.step = step
+        self.smoothing = smoothing
+        self.target = None
+        self.lock = threading.Lock()
+        # Medias móviles para la regresión coste = fijo + por_muestra * n
+        self.mean_n = None
+        self.mean_cost = 0.0
+        self.var_n = 0.0
+        self.cov = 0.0
+        self.size = max_samples
+
+    def set_consumers(self, components):
+        """Toma el objetivo de latencia más exigente de etapas y sumideros."""
+        targets = [c.latency_target for c in components if getattr(c, "latency_target", None)]
+        self.target = min(targets) if targets else None
+        self.size = self.min_samples if self.target is not None else self.max_samples
+
+    def observe(self, n, cost):
+        """Coste (s) de procesar un bloque de `n` muestras."""
+        a = self.smoothing
+        with self.lock:
+            if self.mean_n is None:
+                self.mean_n, self.mean_cost = float(n), cost
+                return
+            dn = n - self.mean_n
+            dc = cost - self.mean_cost
+            self.mean_n += a * dn
+            self.mean_cost += a * dc
+            self.var_n = (1 - a) * (self.var_n + a * dn * dn)
+            self.cov = (1 - a) * (self.cov + a * dn * dc)
+
+    def cost_model(self):
+        """(fijo, por muestra) en segundos; sin variedad de tamaños todo el coste cuenta como fijo."""
+        with self.lock:
+            if self.mean_n is None:
+                return 0.0, 0.0
+            per_sample = max(self.cov / self.var_n, 0.0) if self.var_n > 1.0 else 0.0
+            fixed = max(self.mean_cost - per_sample * self.mean_n, 0.0)
+            return fixed, per_sample
+
+    def next_size(self, queued_samples):
+        """Tamaño del siguiente bloque según el coste observado y las muestras en cola."""
+        fs = self.sampling_rate
+        if queued_samples > self.backlog_blocks * self.size:
+            # Atraso: bloques grandes para amortizar el coste fijo y recuperar
+            return self.settle(min(2 * self.size, self.max_samples))
+        if self.target is None:
+            return self.settle(self.max_samples)
+
+        fixed, per_sample = self.cost_model()
+        # Rendimiento: (fijo + por_muestra * n) * fs / n <= max_utilization
+        spare = self.max_utilization - per_sample * fs
+        throughput = self.max_samples if spare <= 0 else fixed * fs / spare
+        # Latencia: n / fs (llenado) + cola + coste(n) <= objetivo
+        budget = self.target - queued_samples / fs - fixed
+        latency = budget / (1.0 / fs + per_sample) if budget > 0 else self.min_samples
+        return self.settle(max(throughput, min(latency, self.max_samples)))
+
+    def settle(self, size):
+        # Como mucho se dobla o se divide a la mitad por bloque, en múltiplos de `step`
+        size = min(max(size, self.size / 2.0, self.min_samples), 2.0 * self.size, self.max_samples)
+        self.size = max(self.min_samples, int(size // self.step) * self.step)
+        return self.size
@@ -0,0 +1,161 @@
+"""
+Análisis de bloques en un pool de procesos con memoria compartida.
+
+Los bloques se copian a uno de `slots` buffers de multiprocessing.shared_memory
+reservados al arrancar; a los procesos solo se les envía (secuencia, buffer,
+forma), nunca el array, así que no hay pickling de los datos. Los resultados
+vuelven en el mismo orden en que se enviaron los bloques y nunca hay más de
+`slots` bloques pendientes: si el pool va atrasado `submit` espera, sin tocar
+la hebra lectora del pipeline.
+
+Ejemplo:
+    pool = AnalysisPool(block_statistics, workers=3)
+    pipeline = Pipeline(device, stages=[AnalysisStage(pool)], ...)
+
+La función de análisis debe estar definida a nivel de módulo (se pasa a los
+procesos por referencia) y recibe (data, meta), donde data es una vista de
+solo lectura (filas, muestras) sobre la memoria compartida.
+"""
+
+import multiprocessing
+import queue
+import threading
+from collections import deque
+from multiprocessing import shared_memory
+
+import numpy
+
+
+def block_statistics(data, meta):
+    """Análisis de ejemplo: media, RMS y máximo de cada canal analógico."""
+    analog = data[5:]
+    centered = analog - analog.mean(axis=1, keepdims=True)
+    return {
+        "index": meta["index"],
+        "mean": analog.mean(axis=1).tolist(),
+        "rms": numpy.sqrt((centered ** 2).mean(axis=1)).tolist(),
+        "max": analog.max(axis=1).tolist(),
+    }
+
+
+def worker_loop(func, names, shape, tasks, results):
+    buffers = [shared_memory.SharedMemory(name=name) for name in names]
+    views = [numpy.ndarray(shape, dtype=numpy.float64, buffer=shm.buf) for shm in buffers]
+    data = None
+    try:
+        while True:
+            task = tasks.get()
+            if task is None:
+                break
+            seq, slot, rows, n, meta = task
+            data = views[slot][:rows, :n]
+            data.flags.writeable = False
+            try:
+                results.put((seq, slot, func(data, meta), None))
+            except Exception as e:
+                results.put((seq, slot, None, repr(e)))
+    finally:
+        # Las vistas deben soltarse antes de cerrar la memoria compartida
+        views = data = None
+        for shm in buffers:
+            shm.close()
+
+
+class AnalysisPool:
+
+    def __init__(self, func, workers=None, slots=None, max_rows=11, max_samples=1000):
+        self.workers = workers or max(1, multiprocessing.cpu_count() - 1)
+        slots = slots or 2 * self.workers
+        self.shape = (max_rows, max_samples)
+        nbytes = max_rows * max_samples * numpy.dtype(numpy.float64).itemsize
+        self.buffers = [shared_memory.SharedMemory(create=True, size=nbytes) for _ in range(slots)]
+        self.views = [numpy.ndarray(self.shape, dtype=numpy.float64, buffer=shm.buf) for shm in self.buffers]
+        self.free = queue.Queue()
+        for slot in range(slots):
+            self.free.put(slot)
+        self.tasks = multiprocessing.Queue()
+        self.results = multiprocessing.Queue()
+        self.processes = [
+            multiprocessing.Process(target=worker_loop, daemon=True,
+                                    args=(func, [shm.name for shm in self.buffers], self.shape, self.tasks, self.results))
+            for _ in range(self.workers)
+        ]
+        for process in self.processes:
+            process.start()
+        self.next_seq = 0
+        self.next_out = 0
+        self.pending = {}
+        self.ready = deque()
+        self.lock = threading.Lock()
+        self.collector = threading.Thread(target=self.collect, daemon=True)
+        self.collector.start()
+
+    def submit(self, data, meta=None):
+        """Copia el bloque a un buffer libre (espera si no hay) y lo encola."""
+        rows, n = data.shape
+        if rows > self.shape[0] or n > self.shape[1]:
+            raise ValueError("Block of shape %s does not fit in the shared buffers %s" % (data.shape, self.shape))
+        slot = self.free.get()
+        self.views[slot][:rows, :n] = data
+        seq = self.next_seq
+        self.next_seq += 1
+        self.tasks.put((seq, slot, rows, n, meta or {}))
+        return seq
+
+    def collect(self):
+        while True:
+            item = self.results.get()
+            if item is None:
+                break
+            seq, slot, result, error = item
+            self.free.put(slot)
+            with self.lock:
+                self.pending[seq] = (result, error)
+                # Reordenar: solo se entregan resultados consecutivos
+                while self.next_out in self.pending:
+                    self.ready.append((self.next_out,) + self.pending.pop(self.next_out))
+                    self.next_out += 1
+
+    def completed(self):
+        """Resultados ya disponibles, en orden, como (secuencia, resultado, error)."""
+        with self.lock:
+            done = list(self.ready)
+            self.ready.clear()
+        return done
+
+    def outstanding(self):
+        return self.next_seq - self.next_out
+
+    def close(self):
+        for _ in self.processes:
+            self.tasks.put(None)
+        for process in self.processes:
+            process.join()
+        self.results.put(None)
+        self.collector.join()
+        self.views = None
+        for shm in self.buffers:
+            shm.close()
+            shm.unlink()
+
+
+class AnalysisStage:
+    """
+    Etapa del pipeline que envía cada bloque al pool y deja en
+    `block.results['analysis']` los resultados (en orden) que ya hayan
+    terminado, que pueden ser de bloques anteriores. Al cerrarse espera a los
+    bloques pendientes y los devuelve para los sumideros (p. ej. AnalysisSink).
+    """
+
+    def __init__(self, pool):
+        self.pool = pool
+
+    def process(self, block):
+        self.pool.submit(block.data, {"index": block.index, "t0": block.t0, "channels": block.channels})
+        block.results["analysis"] = self.pool.completed()
+
+    def close(self):
+        # El pool termina todas las tareas antes de cerrarse: sus resultados no se pierden
+        self.pool.close()
+        done = self.pool.completed()
+        return {"analysis": done} if done else None
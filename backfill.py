@@ -0,0 +1,251 @@
+"""
+Subida a ThingsBoard de grabaciones antiguas (data_N.csv / data_N.bin).
+
+Lee cada fichero por trozos, convierte el `Timestamp` de cada fila en el `ts`
+(ms) de ThingsBoard y sube lotes grandes de muestras con varias hebras en
+paralelo y un límite de peticiones por segundo. El avance de cada fichero se
+guarda en una base SQLite (`backfill.db`): solo avanza hasta el último lote
+confirmado sin huecos, así que al volver a lanzarlo se sigue donde se quedó y
+no se vuelven a subir rangos ya subidos (como mucho se repiten los lotes que
+estaban en vuelo al cortarse, que ThingsBoard sobrescribe por tener el mismo
+`ts`).
+
+Uso:
+    python backfill.py grabaciones/ --token TOKEN --workers 8 --batch 5000 --rate 20
+"""
+
+import argparse
+import glob
+import os
+import random
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+
+import recordings
+from thingsboard import send_data_to_thingsboard
+
+
+class RateLimiter:
+    """Cubeta de fichas compartida entre hebras: como mucho `rate` peticiones por segundo."""
+
+    def __init__(self, rate, burst=1.0):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.last = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        if not self.rate:
+            return
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.burst, self.tokens + (now - self.last) * self.rate)
+                self.last = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                delay = (1.0 - self.tokens) / self.rate
+            time.sleep(delay)
+
+
+class Checkpoint:
+    """Muestras ya subidas de cada fichero."""
+
+    def __init__(self, path="backfill.db"):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS progress ("
+            " path TEXT PRIMARY KEY, samples INTEGER NOT NULL, last_ts INTEGER, updated REAL NOT NULL)")
+
+    def done(self, path):
+        with self.lock:
+            row = self.conn.execute("SELECT samples FROM progress WHERE path = ?", (path,)).fetchone()
+        return row[0] if row else 0
+
+    def save(self, path, samples, last_ts):
+        with self.lock:
+            self.conn.execute(
+                "INSERT INTO progress (path, samples, last_ts, updated) VALUES (?, ?, ?, ?)"
+                " ON CONFLICT (path) DO UPDATE SET samples = excluded.samples, last_ts = excluded.last_ts,"
+                " updated = excluded.updated", (path, samples, last_ts, time.time()))
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def find_recordings(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "data*.csv")) + glob.glob(os.path.join(path, "data*.bin"))))
+        else:
+            files.append(path)
+    return files
+
+
+def iter_batches(path, batch_size, skip=0, channels=None, sampling_rate=1000):
+    """
+    Lotes de telemetría de un fichero a partir de la muestra `skip`.
+
+    Output: generador de (muestra final del lote, último ts, lista [{"ts", "values"}])
+    """
+    header, chunks = recordings.iter_recording(path, sampling_rate)
+    names = list(header["channels"])
+    rows = [names.index(name) for name in channels] if channels else list(range(len(names)))
+    names = [names[row] for row in rows]
+
+    position = 0
+    first = skip  # muestra del fichero que corresponde a pending[0]
+    pending_ts, pending = [], []
+    for timestamps, data in chunks:
+        n = len(timestamps)
+        start = min(max(skip - position, 0), n)
+        position += n
+        if start == n:
+            continue
+        pending_ts.extend(numpy.rint(timestamps[start:] * 1000).astype(numpy.int64).tolist())
+        pending.extend(data[rows, start:].T.tolist())
+        while len(pending_ts) >= batch_size:
+            batch = [{"ts": t, "values": dict(zip(names, row))}
+                     for t, row in zip(pending_ts[:batch_size], pending[:batch_size])]
+            first += batch_size
+            yield first, batch[-1]["ts"], batch
+            del pending_ts[:batch_size], pending[:batch_size]
+    if pending_ts:
+        batch = [{"ts": t, "values": dict(zip(names, row))} for t, row in zip(pending_ts, pending)]
+        yield first + len(batch), batch[-1]["ts"], batch
+
+
+class Backfill:
+    """
+    Sube ficheros con `workers` hebras y como mucho `rate` peticiones/s. Cada
+    lote se reintenta con backoff exponencial con jitter hasta que ThingsBoard
+    responde 2xx.
+    """
+
+    def __init__(self, device_token, checkpoint, workers=4, batch_size=5000, rate=10.0, channels=None,
+                 base_delay=1.0, max_delay=120.0, send=send_data_to_thingsboard):
+        self.device_token = device_token
+        self.checkpoint = checkpoint
+        self.workers = workers
+        self.batch_size = batch_size
+        self.limiter = RateLimiter(rate, burst=workers)
+        self.channels = channels
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.send = send
+        self.stopped = threading.Event()
+        self.lock = threading.Lock()
+        self.samples = 0
+        self.requests = 0
+        self.failures = 0
+
+    def upload(self, batch):
+        """Sube un lote; devuelve False solo si se ha pedido parar antes de conseguirlo."""
+        failures = 0
+        while not self.stopped.is_set():
+            self.limiter.acquire()
+            ok = self.send(batch, self.device_token, verbose=False)
+            with self.lock:
+                self.requests += 1
+                if ok:
+                    self.samples += len(batch)
+                else:
+                    self.failures += 1
+            if ok:
+                return True
+            failures += 1
+            self.stopped.wait(random.uniform(0, min(self.max_delay, self.base_delay * 2 ** failures)))
+        return False
+
+    def run_file(self, path, pool):
+        key = os.path.abspath(path)
+        skip = self.checkpoint.done(key)
+        # Lotes enviados en orden; el checkpoint avanza hasta el último confirmado sin huecos
+        in_flight = []
+        slots = threading.Semaphore(2 * self.workers)
+
+        def advance():
+            while in_flight and in_flight[0][0].done():
+                future, end, last_ts = in_flight[0]
+                if not future.result():
+                    # Lote sin subir (parada): lo que venga detrás no puede contar
+                    return False
+                in_flight.pop(0)
+                self.checkpoint.save(key, end, last_ts)
+            return True
+
+        for end, last_ts, batch in iter_batches(path, self.batch_size, skip, self.channels):
+            slots.acquire()
+            if self.stopped.is_set():
+                break
+            future = pool.submit(self.upload, batch)
+            future.add_done_callback(lambda _: slots.release())
+            in_flight.append((future, end, last_ts))
+            advance()
+        for future, _, _ in in_flight:
+            future.result()
+        advance()
+        return self.checkpoint.done(key) - skip
+
+    def run(self, paths):
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            try:
+                for path in paths:
+                    if self.stopped.is_set():
+                        break
+                    start = time.monotonic()
+                    samples = self.run_file(path, pool)
+                    elapsed = time.monotonic() - start
+                    print(f"{path}: {samples} muestras subidas en {elapsed:.1f} s "
+                          f"({samples / max(elapsed, 1e-9):.0f} muestras/s)")
+            except KeyboardInterrupt:
+                # Las hebras dejan de reintentar para que el pool pueda cerrarse
+                self.stop()
+                raise
+
+    def stop(self):
+        self.stopped.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sube a ThingsBoard grabaciones antiguas")
+    parser.add_argument("paths", nargs="+", help="ficheros CSV/binarios o directorios con data_N.*")
+    parser.add_argument("--token", required=True, help="token del dispositivo en ThingsBoard")
+    parser.add_argument("--url", help="URL de ThingsBoard (por defecto THINGSBOARD_URL)")
+    parser.add_argument("--channels", nargs="+", help="canales a subir (por defecto todos los grabados)")
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--batch", type=int, default=5000, help="muestras por petición")
+    parser.add_argument("--rate", type=float, default=10.0, help="peticiones por segundo como máximo (0 = sin límite)")
+    parser.add_argument("--checkpoint", default="backfill.db")
+    args = parser.parse_args()
+
+    if args.url:
+        import thingsboard
+        thingsboard.THINGSBOARD_URL = args.url
+
+    checkpoint = Checkpoint(args.checkpoint)
+    backfill = Backfill(args.token, checkpoint, args.workers, args.batch, args.rate, args.channels)
+    start = time.monotonic()
+    try:
+        backfill.run(find_recordings(args.paths))
+    except KeyboardInterrupt:
+        # Lo confirmado ya está en el checkpoint; la próxima vez se sigue desde ahí
+        pass
+    elapsed = time.monotonic() - start
+    print(f"{backfill.samples} muestras en {backfill.requests} peticiones ({backfill.failures} fallidas), "
+          f"{backfill.samples / max(elapsed, 1e-9):.0f} muestras/s")
+    checkpoint.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,176 @@
+"""
+Análisis offline en paralelo de sesiones grabadas (data_N.csv).
+
+Reparte ficheros (o trozos de `--chunk-seconds` de cada fichero) entre un pool
+de procesos; cada uno calcula estadísticas por canal, la envolvente EMG
+filtrada y los episodios detectados con las mismas clases que se usan en
+tiempo real (EMGFilterChain y BruxismDetector), y el resultado se agrupa en un
+resumen por fichero.
+
+Uso:
+    python batch_analysis.py grabaciones/ --workers 8 --output resumen.csv
+    python batch_analysis.py data_1.csv data_2.csv --chunk-seconds 600
+
+Cada trozo lee además la señal posterior hasta `merge_gap` más la duración
+máxima esperada de un episodio (`--max-episode-seconds`), de modo que los
+episodios que empiezan en un trozo y acaban en el siguiente se cierran en el
+trozo donde empiezan y no se cuentan dos veces ni se pierden.
+"""
+
+import argparse
+import csv
+import glob
+import os
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+import numpy
+
+from detector import BruxismDetector
+from emg_filters import EMGFilterChain
+
+
+def find_recordings(paths):
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(glob.glob(os.path.join(path, "data*.csv"))))
+        else:
+            files.append(path)
+    return files
+
+
+def read_header(path):
+    with open(path, newline='') as file:
+        header = next(csv.reader(file))
+        first = next(csv.reader(file), None)
+    t0 = datetime.fromisoformat(first[1]).timestamp() if first else 0.0
+    return header, t0
+
+
+def count_rows(path):
+    with open(path, "rb") as file:
+        lines = sum(chunk.count(b"\n") for chunk in iter(lambda: file.read(1 << 20), b""))
+    return max(lines - 1, 0)
+
+
+def analyse_chunk(path, channels, sampling_rate, start, count, warmup, overrun=0, merge_gap=3.0):
+    """
+    Analiza `count` filas desde `start`; las `warmup` filas previas solo sirven
+    para asentar filtros y línea base y no cuentan en las estadísticas, y las
+    `overrun` filas posteriores solo sirven para cerrar los episodios que
+    empiezan dentro del trozo.
+    """
+    header, t0 = read_header(path)
+    columns = [header.index(channel) for channel in channels]
+    skip = max(start - warmup, 0)
+    lead = start - skip
+    data = numpy.loadtxt(path, delimiter=",", skiprows=1 + skip, max_rows=lead + count + overrun,
+                         usecols=columns, ndmin=2).T
+    signal = data[:, lead:lead + count]
+    result = {
+        "file": path,
+        "start": start,
+        "samples": signal.shape[1],
+        "sum": signal.sum(axis=1),
+        "sumsq": (signal ** 2).sum(axis=1),
+        "min": signal.min(axis=1) if signal.size else numpy.full(len(channels), numpy.nan),
+        "max": signal.max(axis=1) if signal.size else numpy.full(len(channels), numpy.nan),
+        "envelope_sum": numpy.zeros(len(channels)),
+        "episodes": [],
+    }
+    if not signal.size:
+        return result
+
+    filtered, envelope = EMGFilterChain(sampling_rate).process(data)
+    result["envelope_sum"] = envelope[:, lead:lead + count].sum(axis=1)
+    detector = BruxismDetector(sampling_rate, channels, merge_gap=merge_gap)
+    chunk_t0 = t0 + skip / float(sampling_rate)
+    chunk_start = t0 + start / float(sampling_rate)
+    chunk_end = chunk_start + signal.shape[1] / float(sampling_rate)
+    events = []
+    for i in range(0, data.shape[1], sampling_rate):
+        events += detector.process_envelope(chunk_t0 + i / float(sampling_rate),
+                                            envelope[:, i:i + sampling_rate], filtered[:, i:i + sampling_rate])
+    # Fin del fichero (o de lo leído tras el trozo): se cierra el episodio abierto
+    events += detector.flush(chunk_t0 + data.shape[1] / float(sampling_rate))
+    # Solo cuentan los episodios que empiezan dentro del trozo (no en el calentamiento ni después)
+    result["episodes"] = [e for e in events if e["event"] == "episode" and chunk_start <= e["start"] < chunk_end]
+    return result
+
+
+def summarise(path, parts, channels, sampling_rate):
+    samples = sum(p["samples"] for p in parts)
+    total = numpy.sum([p["sum"] for p in parts], axis=0)
+    sumsq = numpy.sum([p["sumsq"] for p in parts], axis=0)
+    envelope = numpy.sum([p["envelope_sum"] for p in parts], axis=0)
+    mean = total / max(samples, 1)
+    std = numpy.sqrt(numpy.maximum(sumsq / max(samples, 1) - mean ** 2, 0.0))
+    episodes = [e for p in parts for e in p["episodes"]]
+    classes = Counter(e["class"] for e in episodes)
+    hours = samples / float(sampling_rate) / 3600.0
+    row = {
+        "file": path,
+        "samples": samples,
+        "duration_s": samples / float(sampling_rate),
+        "episodes": len(episodes),
+        "episodes_per_hour": len(episodes) / hours if hours else 0.0,
+        "episode_time_s": sum(e["duration"] for e in episodes),
+    }
+    for name in ("phasic", "tonic", "mixed", "isolated"):
+        row[name] = classes.get(name, 0)
+    for i, channel in enumerate(channels):
+        row[f"{channel}_mean"] = mean[i]
+        row[f"{channel}_std"] = std[i]
+        row[f"{channel}_min"] = numpy.min([p["min"][i] for p in parts])
+        row[f"{channel}_max"] = numpy.max([p["max"][i] for p in parts])
+        row[f"{channel}_envelope_mean"] = envelope[i] / max(samples, 1)
+    return row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Análisis offline de sesiones grabadas")
+    parser.add_argument("paths", nargs="+", help="ficheros CSV o directorios con data_N.csv")
+    parser.add_argument("--channels", nargs="+", default=["A0", "A1", "A2", "A3"])
+    parser.add_argument("--sampling-rate", type=int, default=1000)
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--chunk-seconds", type=float, default=None,
+                        help="reparte cada fichero en trozos de esta duración")
+    parser.add_argument("--warmup-seconds", type=float, default=10.0,
+                        help="señal previa a cada trozo para asentar filtros y línea base")
+    parser.add_argument("--merge-gap", type=float, default=3.0,
+                        help="ráfagas separadas menos de esto forman un mismo episodio")
+    parser.add_argument("--max-episode-seconds", type=float, default=60.0,
+                        help="duración máxima esperada de un episodio (lectura tras cada trozo)")
+    parser.add_argument("--output", default="summary.csv")
+    args = parser.parse_args()
+
+    files = find_recordings(args.paths)
+    warmup = int(args.warmup_seconds * args.sampling_rate)
+    overrun = int((args.merge_gap + args.max_episode_seconds) * args.sampling_rate) if args.chunk_seconds else 0
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {}
+        for path in files:
+            rows = count_rows(path)
+            if not rows:
+                continue
+            step = int(args.chunk_seconds * args.sampling_rate) if args.chunk_seconds else rows
+            futures[path] = [pool.submit(analyse_chunk, path, args.channels, args.sampling_rate, start, step, warmup,
+                                         overrun, args.merge_gap)
+                             for start in range(0, rows, step)]
+        summary = [summarise(path, [f.result() for f in chunks], args.channels, args.sampling_rate)
+                   for path, chunks in futures.items()]
+
+    with open(args.output, mode='w', newline='') as file:
+        writer = csv.DictWriter(file, fieldnames=list(summary[0]) if summary else ["file"])
+        writer.writeheader()
+        writer.writerows(summary)
+    for row in summary:
+        print(f"{row['file']}: {row['duration_s']:.0f} s, {row['episodes']} episodios "
+              f"({row['episodes_per_hour']:.1f}/h)")
+    print("Resumen guardado en", args.output)
+
+
+if __name__ == '__main__':
+    main()
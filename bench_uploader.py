@@ -0,0 +1,147 @@
+"""
+Benchmark del emisor a ThingsBoard contra mock_thingsboard.py.
+
+Mide muestras/s sostenidas, número de peticiones y latencia (p50/p95/p99) de
+cada modo de subida:
+
+    single      una muestra por petición (como los scripts originales)
+    batch       lista de `batch` muestras con timestamp por petición
+    concurrent  como batch pero con `workers` peticiones en paralelo
+    outbox      Outbox en SQLite + OutboxUploader
+
+Uso:
+    python bench_uploader.py --samples 20000 --batch 500 --workers 4 --latency 0.02
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from mock_thingsboard import MockThingsBoard
+from outbox import Outbox, OutboxUploader
+from thingsboard import send_data_to_thingsboard
+
+DEVICE_TOKEN = "benchmark"
+
+
+def make_samples(n):
+    t0 = int(time.time() * 1000)
+    return [{"ts": t0 + i, "values": {"A0": 510, "A1": 511, "A2": 509, "A3": 512}} for i in range(n)]
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100.0 * (len(values) - 1))))]
+
+
+class TimedSender:
+    """Envuelve send_data_to_thingsboard y guarda la latencia de cada petición."""
+
+    def __init__(self, base_url):
+        self.send = partial(send_data_to_thingsboard, base_url=base_url, verbose=False)
+        self.latencies = []
+        self.lock = threading.Lock()
+
+    def __call__(self, telemetry_data, device_token):
+        start = time.perf_counter()
+        ok = self.send(telemetry_data, device_token)
+        with self.lock:
+            self.latencies.append(time.perf_counter() - start)
+        return ok
+
+
+def run_single(sender, samples, args):
+    for sample in samples:
+        sender(sample["values"], DEVICE_TOKEN)
+
+
+def run_batch(sender, samples, args):
+    for i in range(0, len(samples), args.batch):
+        sender(samples[i:i + args.batch], DEVICE_TOKEN)
+
+
+def run_concurrent(sender, samples, args):
+    with ThreadPoolExecutor(max_workers=args.workers) as pool:
+        batches = [samples[i:i + args.batch] for i in range(0, len(samples), args.batch)]
+        list(pool.map(lambda batch: sender(batch, DEVICE_TOKEN), batches))
+
+
+def run_outbox(sender, samples, args):
+    with tempfile.TemporaryDirectory() as tmp:
+        outbox = Outbox(os.path.join(tmp, "outbox.db"))
+        uploader = OutboxUploader(outbox, DEVICE_TOKEN, batch_size=args.batch, send=sender)
+        uploader.start()
+        # Se encola en bloques de 1000 como haría el lector a 1000 Hz
+        for i in range(0, len(samples), 1000):
+            outbox.put_many(samples[i:i + 1000])
+        while len(outbox):
+            time.sleep(0.01)
+        uploader.stop()
+        uploader.join()
+        outbox.close()
+
+
+MODES = {
+    "single": run_single,
+    "batch": run_batch,
+    "concurrent": run_concurrent,
+    "outbox": run_outbox,
+}
+
+
+def bench(mode, args):
+    mock = MockThingsBoard(latency=args.latency, error_rate=args.error_rate, max_rps=args.max_rps).start()
+    try:
+        sender = TimedSender(mock.url)
+        n = args.single_samples if mode == "single" else args.samples
+        samples = make_samples(n)
+        start = time.perf_counter()
+        MODES[mode](sender, samples, args)
+        elapsed = time.perf_counter() - start
+        stats = mock.stats()
+    finally:
+        mock.stop()
+    latencies_ms = [latency * 1000 for latency in sender.latencies]
+    return {
+        "mode": mode,
+        "samples": stats["samples"],
+        "elapsed_s": elapsed,
+        "samples_per_s": stats["samples"] / elapsed if elapsed else 0.0,
+        "requests": len(sender.latencies),
+        "errors": stats["errors"],
+        "throttled": stats["throttled"],
+        "p50_ms": percentile(latencies_ms, 50),
+        "p95_ms": percentile(latencies_ms, 95),
+        "p99_ms": percentile(latencies_ms, 99),
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Benchmark del emisor a ThingsBoard")
+    parser.add_argument("--modes", nargs="+", default=list(MODES), choices=list(MODES))
+    parser.add_argument("--samples", type=int, default=20000)
+    parser.add_argument("--single-samples", type=int, default=1000, help="muestras para el modo single (muy lento)")
+    parser.add_argument("--batch", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--max-rps", type=float, default=None)
+    parser.add_argument("--json", help="fichero donde guardar los resultados")
+    args = parser.parse_args()
+
+    results = []
+    for mode in args.modes:
+        result = bench(mode, args)
+        results.append(result)
+        print(f"{mode:>10}: {result['samples_per_s']:10.0f} muestras/s  {result['requests']:6d} peticiones  "
+              f"p50 {result['p50_ms']:7.1f} ms  p95 {result['p95_ms']:7.1f} ms  p99 {result['p99_ms']:7.1f} ms")
+    if args.json:
+        with open(args.json, "w") as file:
+            json.dump(results, file, indent=2)
@@ -0,0 +1,387 @@
+"""
+Benchmarks sin dispositivo del driver, el pipeline, el almacenamiento y la subida.
+
+Grupos:
+    decode      BITalino.decode, tramas/s para 1 a 6 canales
+    read        BITalino.read sobre un socket en memoria, muestras/s
+    handoff     paso muestra a muestra por queue.Queue (scripts antiguos) frente a bloques del Pipeline
+    sinks       escritura de CsvSink y BinarySink, muestras/s
+    upload      subida por lotes y con Outbox contra mock_thingsboard.py
+    end_to_end  lectura + filtrado + detector + CSV + binario + Outbox, muestras/s y latencia
+
+Los resultados se guardan en JSON; con --compare se comparan con una ejecución
+anterior y se marca como regresión cualquier métrica que empeore más de
+--threshold (las *_per_s deben subir, las *_ms bajar).
+
+Uso:
+    python benchmarks.py --output bench_results.json
+    python benchmarks.py --only decode read --compare bench_results.json
+"""
+
+import argparse
+import json
+import os
+import platform
+import queue
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+import numpy
+
+import bench_uploader
+from bitalino import BITalino
+from detector import DetectorStage
+from emg_filters import EMGFilterStage
+from mock_thingsboard import MockThingsBoard
+from outbox import Outbox, OutboxUploader
+from pipeline import Block, Pipeline
+from sinks import BinarySink, CsvSink, TelemetrySink
+from thingsboard import send_data_to_thingsboard
+
+
+def frame_bytes(n_channels):
+    if n_channels <= 4:
+        return int(-(-(12 + 10 * n_channels) // 8))
+    return int(-(-(52 + 6 * (n_channels - 4)) // 8))
+
+
+def crc4(frame):
+    """CRC de 4 bits tal y como lo comprueba BITalino.decode."""
+    x0 = x1 = x2 = x3 = 0
+    last = len(frame) - 1
+    for index, byte in enumerate(frame):
+        for bit in range(7, -1, -1):
+            inp = 0 if index == last and bit < 4 else byte >> bit & 0x01
+            out = x3
+            x3 = x2
+            x2 = x1
+            x1 = out ^ x0
+            x0 = inp ^ out
+    return (x3 << 3) | (x2 << 2) | (x1 << 1) | x0
+
+
+def encode_frame(seq, digital, analog, n_channels):
+    """Construye una trama BITalino (la inversa de BITalino.decode)."""
+    nb = frame_bytes(n_channels)
+    a = list(analog) + [0] * (6 - len(analog))
+    frame = bytearray(nb)
+    frame[nb - 1] = (seq & 0x0F) << 4
+    frame[nb - 2] = (digital[0] << 7 | digital[1] << 6 | digital[2] << 5 | digital[3] << 4) | (a[0] >> 6 & 0x0F)
+    frame[nb - 3] = (a[0] & 0x3F) << 2 | (a[1] >> 8 & 0x03)
+    if nb >= 4:
+        frame[nb - 4] = a[1] & 0xFF
+    if nb >= 6:
+        frame[nb - 5] = a[2] >> 2 & 0xFF
+        frame[nb - 6] = (a[2] & 0x03) << 6 | (a[3] >> 4 & 0x3F)
+    if nb >= 7:
+        frame[nb - 7] = (a[3] & 0x0F) << 4 | (a[4] >> 2 & 0x0F)
+    if nb >= 8:
+        frame[nb - 8] = (a[4] & 0x03) << 6 | (a[5] & 0x3F)
+    frame[nb - 1] |= crc4(frame)
+    return bytes(frame)
+
+
+def make_stream(n_channels, n_frames=1000, seed=0):
+    rng = numpy.random.default_rng(seed)
+    analog = rng.integers(480, 540, size=(n_frames, 6))
+    analog[:, 4:] = rng.integers(0, 63, size=(n_frames, 2))  # A4 y A5 son de 6 bits
+    return b"".join(encode_frame(i, (0, 0, 0, 0), analog[i, :n_channels], n_channels) for i in range(n_frames))
+
+
+class MemorySocket:
+    """Socket en memoria que repite indefinidamente un flujo de tramas."""
+
+    def __init__(self, data):
+        self.data = data
+        self.pos = 0
+
+    def recv(self, n):
+        chunk = self.data[self.pos:self.pos + n]
+        self.pos += n
+        if self.pos >= len(self.data):
+            self.pos = 0
+        return chunk
+
+    read = recv
+
+    def send(self, data):
+        return len(data)
+
+    def close(self):
+        pass
+
+
+def memory_device(n_channels, n_frames=1000):
+    device = BITalino()
+    device.socket = MemorySocket(make_stream(n_channels, n_frames))
+    device.analogChannels = list(range(n_channels))
+    return device
+
+
+def repeat(func, min_time):
+    """Ejecuta func hasta sumar min_time segundos; devuelve (repeticiones, segundos)."""
+    count = 0
+    start = time.perf_counter()
+    while True:
+        func()
+        count += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return count, elapsed
+
+
+def percentile(values, p):
+    return float(numpy.percentile(values, p)) if len(values) else 0.0
+
+
+def bench_decode(args):
+    results = {}
+    decoder = BITalino()
+    for n in range(1, 7):
+        nb = frame_bytes(n)
+        stream = make_stream(n, 1000)
+        frames = [stream[i:i + nb] for i in range(0, len(stream), nb)]
+
+        def decode_all():
+            for frame in frames:
+                decoder.decode(frame, n)
+
+        count, elapsed = repeat(decode_all, args.min_time)
+        results[f"decode_{n}ch_frames_per_s"] = count * len(frames) / elapsed
+    return results
+
+
+def bench_read(args):
+    results = {}
+    for n in (1, 4, 6):
+        device = memory_device(n)
+        count, elapsed = repeat(lambda: device.read(1000), args.min_time)
+        results[f"read_{n}ch_samples_per_s"] = count * 1000 / elapsed
+    return results
+
+
+def bench_handoff(args):
+    n_samples = 1000
+    blocks = 100
+    data = numpy.zeros((11, n_samples))
+
+    # Scripts antiguos: una tupla por muestra en queue.Queue con una Condition compartida
+    data_queue = queue.Queue(maxsize=10000)
+    condition = threading.Condition()
+
+    def consumer():
+        for _ in range(blocks * n_samples):
+            with condition:
+                while data_queue.empty():
+                    condition.wait()
+                data_queue.get()
+                condition.notify()
+
+    start = time.perf_counter()
+    thread = threading.Thread(target=consumer)
+    thread.start()
+    for _ in range(blocks):
+        with condition:
+            for i in range(n_samples):
+                while data_queue.full():
+                    condition.wait()
+                data_queue.put(("", data[5, i], data[6, i], data[7, i], data[8, i], 0.2))
+                condition.notify()
+    thread.join()
+    legacy = blocks * n_samples / (time.perf_counter() - start)
+
+    # Pipeline: un Block por lectura
+    source = LimitedSource(StaticSource(data), blocks)
+    pipeline = Pipeline(source, n_samples=n_samples)
+    source.pipeline = pipeline
+    start = time.perf_counter()
+    pipeline.start()
+    pipeline.join()
+    block = blocks * n_samples / (time.perf_counter() - start)
+    return {"handoff_per_sample_queue_samples_per_s": legacy, "handoff_block_pipeline_samples_per_s": block}
+
+
+def bench_sinks(args):
+    results = {}
+    rng = numpy.random.default_rng(0)
+    data = numpy.vstack((numpy.zeros((5, 1000)), rng.integers(480, 540, size=(6, 1000)).astype(float)))
+    with tempfile.TemporaryDirectory() as tmp:
+        for name, sink, path in (("csv", CsvSink(os.path.join(tmp, "data")), "data_1.csv"),
+                                 ("binary", BinarySink(os.path.join(tmp, "data")), "data_1.bin")):
+            t0 = time.time()
+            index = [0]
+
+            def write():
+                sink.write(Block(data, t0 + index[0], 1000, range(6), index[0]))
+                index[0] += 1
+
+            count, elapsed = repeat(write, args.min_time)
+            sink.close()
+            results[f"sink_{name}_samples_per_s"] = count * 1000 / elapsed
+            results[f"sink_{name}_bytes_per_sample"] = os.path.getsize(os.path.join(tmp, path)) / (count * 1000.0)
+    return results
+
+
+def bench_upload(args):
+    options = argparse.Namespace(samples=args.upload_samples, single_samples=0, batch=500, workers=4,
+                                 latency=args.latency, error_rate=0.0, max_rps=None)
+    results = {}
+    for mode in ("batch", "concurrent", "outbox"):
+        result = bench_uploader.bench(mode, options)
+        results[f"upload_{mode}_samples_per_s"] = result["samples_per_s"]
+        results[f"upload_{mode}_p99_ms"] = result["p99_ms"]
+    return results
+
+
+class StaticSource:
+    """Fuente sin dispositivo que devuelve siempre el mismo bloque."""
+
+    def __init__(self, data):
+        self.data = data
+
+    def read(self, n_samples):
+        return self.data[:, :n_samples]
+
+
+class LimitedSource:
+    """Envuelve una fuente y para el pipeline tras `blocks` lecturas."""
+
+    def __init__(self, source, blocks):
+        self.source = source
+        self.blocks = blocks
+        self.pipeline = None
+
+    def read(self, n_samples):
+        self.blocks -= 1
+        if self.blocks <= 0:
+            self.pipeline.stop()
+        return self.source.read(n_samples)
+
+
+class LatencySink:
+    """Mide el tiempo desde que llega la última muestra del bloque hasta que pasa por los sumideros."""
+
+    def __init__(self):
+        self.latencies = []
+
+    def write(self, block):
+        self.latencies.append(time.time() - (block.t0 + block.duration))
+
+    def close(self):
+        pass
+
+
+def bench_end_to_end(args):
+    mock = MockThingsBoard(latency=args.latency).start()
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            outbox = Outbox(os.path.join(tmp, "outbox.db"))
+            send = lambda values, token: send_data_to_thingsboard(values, token, base_url=mock.url, verbose=False)
+            uploader = OutboxUploader(outbox, "benchmark", batch_size=5, send=send)
+            latency = LatencySink()
+            source = LimitedSource(memory_device(6), args.blocks)
+            pipeline = Pipeline(
+                source, 1000, 1000, range(6),
+                stages=[EMGFilterStage(("A0", "A1", "A2", "A3")), DetectorStage()],
+                sinks=[CsvSink(os.path.join(tmp, "data")), BinarySink(os.path.join(tmp, "data")),
+                       TelemetrySink(outbox), latency])
+            source.pipeline = pipeline
+            uploader.start()
+            start = time.perf_counter()
+            pipeline.start()
+            pipeline.join()
+            elapsed = time.perf_counter() - start
+            while len(outbox) and time.perf_counter() - start < elapsed + 60:
+                time.sleep(0.01)
+            drained = time.perf_counter() - start
+            uploader.stop()
+            uploader.join()
+            outbox.close()
+    finally:
+        mock.stop()
+    latencies_ms = [1000 * value for value in latency.latencies]
+    return {
+        "end_to_end_samples_per_s": args.blocks * 1000 / elapsed,
+        "end_to_end_uploaded_samples_per_s": mock.stats()["samples"] / drained,
+        "end_to_end_block_p50_ms": percentile(latencies_ms, 50),
+        "end_to_end_block_p99_ms": percentile(latencies_ms, 99),
+    }
+
+
+GROUPS = {
+    "decode": bench_decode,
+    "read": bench_read,
+    "handoff": bench_handoff,
+    "sinks": bench_sinks,
+    "upload": bench_upload,
+    "end_to_end": bench_end_to_end,
+}
+
+
+def environment():
+    try:
+        revision = subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                           stderr=subprocess.DEVNULL).strip()
+    except Exception:
+        revision = None
+    return {
+        "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "revision": revision,
+        "python": sys.version.split()[0],
+        "numpy": numpy.__version__,
+        "machine": platform.machine(),
+        "processor": platform.processor(),
+    }
+
+
+def compare(results, baseline, threshold):
+    regressions = []
+    for name, value in results.items():
+        old = baseline.get(name)
+        if not old:
+            continue
+        if name.endswith("_per_s") and value < old * (1 - threshold):
+            regressions.append((name, old, value))
+        elif name.endswith("_ms") and value > old * (1 + threshold):
+            regressions.append((name, old, value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks sin dispositivo")
+    parser.add_argument("--only", nargs="+", choices=list(GROUPS), default=list(GROUPS))
+    parser.add_argument("--min-time", type=float, default=1.0, help="segundos mínimos por medida")
+    parser.add_argument("--blocks", type=int, default=30, help="bloques de 1000 muestras en end_to_end")
+    parser.add_argument("--upload-samples", type=int, default=20000)
+    parser.add_argument("--latency", type=float, default=0.0, help="latencia simulada de ThingsBoard (s)")
+    parser.add_argument("--output", help="fichero JSON donde guardar los resultados")
+    parser.add_argument("--compare", help="JSON de una ejecución anterior")
+    parser.add_argument("--threshold", type=float, default=0.1)
+    args = parser.parse_args()
+
+    results = {}
+    for group in args.only:
+        print(f"== {group}")
+        for name, value in GROUPS[group](args).items():
+            print(f"{name:>45}: {value:14.2f}")
+            results[name] = value
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump({"environment": environment(), "results": results}, file, indent=2)
+
+    if args.compare:
+        with open(args.compare) as file:
+            baseline = json.load(file)["results"]
+        regressions = compare(results, baseline, args.threshold)
+        for name, old, new in regressions:
+            print(f"REGRESIÓN {name}: {old:.2f} -> {new:.2f}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
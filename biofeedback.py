@@ -0,0 +1,184 @@
+"""
+Biorretroalimentación en lazo cerrado: al detectar un apretón se activa una
+salida digital del BITalino (motor de vibración, zumbador...) con `trigger`.
+
+Con bloques de 1000 muestras la reacción llegaría más de un segundo tarde,
+así que Biofeedback es un oyente del Pipeline: la hebra lectora le pasa cada
+sub-bloque (p. ej. 20 muestras) en cuanto se decodifica. Sobre él evalúa un
+criterio barato (valor medio rectificado de la señal filtrada frente a k veces
+su línea base, como en detector.py) y, si se cumple, encarga el `trigger` a
+una hebra propia para no bloquear nunca la lectura.
+
+Para cada disparo se mide la latencia desde la primera muestra que superó el
+umbral hasta que la orden sale hacia el dispositivo, y se acumula en un
+histograma para comprobar que se cumple el presupuesto (`budget`). No incluye
+el retardo del propio enlace Bluetooth antes de que lleguen las muestras.
+
+Uso:
+    feedback = Biofeedback(source, ("A0", "A1"), sampling_rate=1000, budget=0.05)
+    pipeline = Pipeline(source, ..., listeners=[feedback], sub_block=20)
+    ...
+    print(feedback.stats())
+"""
+
+import queue
+import threading
+import time
+
+import numpy
+from scipy import signal
+
+from emg_filters import SOSFilter
+from pipeline import CHANNEL_NAMES, channel_index
+
+
+class LatencyHistogram:
+    """Histograma de latencias en cubos de `bucket_ms` hasta `max_ms` (lo demás va al último)."""
+
+    def __init__(self, bucket_ms=5, max_ms=500):
+        self.bucket_ms = bucket_ms
+        self.counts = numpy.zeros(int(max_ms // bucket_ms) + 1, dtype=numpy.int64)
+        self.values = []
+        self.lock = threading.Lock()
+
+    def add(self, seconds):
+        ms = 1000.0 * seconds
+        with self.lock:
+            self.counts[min(int(ms // self.bucket_ms), len(self.counts) - 1)] += 1
+            self.values.append(ms)
+
+    def percentile(self, p):
+        with self.lock:
+            return float(numpy.percentile(self.values, p)) if self.values else 0.0
+
+    def within(self, seconds):
+        """Fracción de medidas que no pasan de `seconds`."""
+        with self.lock:
+            if not self.values:
+                return 1.0
+            return float(numpy.mean(numpy.array(self.values) <= 1000.0 * seconds))
+
+    def buckets(self):
+        """{'0-5': n, '5-10': n, ..., '>=500': n} sin los cubos vacíos."""
+        with self.lock:
+            counts = self.counts.tolist()
+        result = {}
+        for i, count in enumerate(counts):
+            if not count:
+                continue
+            low = i * self.bucket_ms
+            label = f"{low}-{low + self.bucket_ms}" if i < len(counts) - 1 else f">={low}"
+            result[label] = count
+        return result
+
+    def __len__(self):
+        return len(self.values)
+
+
+class Biofeedback:
+    """
+    Oyente del pipeline que dispara `target.trigger(output)` durante `pulse`
+    segundos al empezar un apretón en al menos `min_channels` canales. Sin
+    `target` (p. ej. con ReplaySource) solo mide cuándo se habría disparado.
+    """
+
+    def __init__(self, target=None, channels=("A0", "A1", "A2", "A3"), sampling_rate=1000, bandpass=(20.0, 450.0),
+                 order=4, baseline_tau=30.0, k_on=6.0, k_off=3.0, min_channels=1, pulse=0.5,
+                 output=(1, 0, 0, 0), budget=0.05, min_baseline=1.0):
+        self.target = target
+        self.channels = [CHANNEL_NAMES[channel_index(c)] for c in channels]
+        self.analog_channels = self.channels
+        self.sampling_rate = sampling_rate
+        high = min(bandpass[1], 0.45 * sampling_rate)
+        self.filter = SOSFilter(signal.butter(order, (bandpass[0], high), btype="bandpass", fs=sampling_rate,
+                                              output="sos"))
+        self.baseline_tau = baseline_tau
+        self.k_on = k_on
+        self.k_off = k_off
+        self.min_channels = min_channels
+        self.pulse = pulse
+        self.output = list(output)
+        self.budget = budget
+        self.min_baseline = min_baseline
+        self.baseline = None
+        self.active = False
+        self.histogram = LatencyHistogram()
+        self.triggers = 0
+        self.missed = 0
+        self.commands = queue.Queue()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def feed(self, data, channels):
+        """Llamado desde la hebra lectora con cada sub-bloque (filas como BITalino.read)."""
+        arrived = time.perf_counter()
+        rows = [5 + channels.index(channel_index(c)) for c in self.channels]
+        rectified = numpy.abs(self.filter.process(data[rows]))
+        level = rectified.mean(axis=1)
+        if self.baseline is None:
+            self.baseline = level
+            return
+
+        # Suelo para la línea base: con señal plana cualquier ruido dispararía
+        baseline = numpy.maximum(self.baseline, self.min_baseline)
+        on = level > self.k_on * baseline
+        if not self.active and on.sum() >= self.min_channels:
+            self.active = True
+            # Primera muestra que supera el umbral; llegó (n - 1 - i) periodos antes que la última
+            above = (rectified > (self.k_on * baseline)[:, None]).any(axis=0)
+            first = int(numpy.argmax(above)) if above.any() else rectified.shape[1] - 1
+            onset = arrived - (rectified.shape[1] - 1 - first) / float(self.sampling_rate)
+            self.commands.put(onset)
+        elif self.active and not (level > self.k_off * baseline).any():
+            self.active = False
+
+        if not self.active:
+            # Media móvil exponencial de la línea base solo en reposo
+            alpha = min(1.0, rectified.shape[1] / (self.baseline_tau * self.sampling_rate))
+            self.baseline = (1 - alpha) * self.baseline + alpha * level
+
+    def run(self):
+        off_at = None
+        while True:
+            timeout = None if off_at is None else max(off_at - time.perf_counter(), 0.0)
+            try:
+                onset = self.commands.get(timeout=timeout)
+            except queue.Empty:
+                self.send([0, 0, 0, 0])
+                off_at = None
+                continue
+            if onset is None:
+                break
+            self.send(self.output)
+            latency = time.perf_counter() - onset
+            self.histogram.add(latency)
+            self.triggers += 1
+            if latency > self.budget:
+                self.missed += 1
+            off_at = time.perf_counter() + self.pulse
+        if off_at is not None:
+            self.send([0, 0, 0, 0])
+
+    def send(self, digital):
+        if self.target is None:
+            return
+        try:
+            self.target.trigger(digital)
+        except Exception as e:
+            # Sin conexión en ese momento: se pierde este disparo, no la adquisición
+            print("No se pudo activar la salida:", e)
+
+    def stats(self):
+        return {
+            "triggers": self.triggers,
+            "over_budget": self.missed,
+            "within_budget": self.histogram.within(self.budget),
+            "p50_ms": self.histogram.percentile(50),
+            "p95_ms": self.histogram.percentile(95),
+            "p99_ms": self.histogram.percentile(99),
+            "histogram_ms": self.histogram.buckets(),
+        }
+
+    def close(self):
+        self.commands.put(None)
+        self.thread.join(2)
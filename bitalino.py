@@ -12,13 +12,8 @@ Created on Tue Jun 25 13:44:28 2013
 """
 
 
-try:
-    import bluetooth
-    from bluetooth import discover_devices
-except ImportError:
-    pass
-import serial
-from serial.tools import list_ports
+# bluetooth and serial are imported when a connection of that type is used,
+# so importing this module does not load either transport
 import time
 import math
 import numpy
@@ -37,6 +32,7 @@ class BITalino(object):
         self.number_bytes = None
         self.macAddress = None
         self.serial = False
+        self.profile = None
     
     def find(self, serial=False):
         """
@@ -47,8 +43,10 @@ class BITalino(object):
         
         try:
             if serial:
+                from serial.tools import list_ports
                 nearby_devices = list(port[0] for port in list_ports.comports() if 'bitalino' or 'COM' in port[0])
             else:
+                from bluetooth import discover_devices
                 nearby_devices = discover_devices(lookup_names=True)
             return nearby_devices
         except:
@@ -72,9 +70,11 @@ class BITalino(object):
             if macAddress != None:
                 try:
                     if ":" in macAddress and len(macAddress) == 17:
+                        import bluetooth
                         self.socket = bluetooth.BluetoothSocket(bluetooth.RFCOMM)
                         self.socket.connect((macAddress, 1))
                     else:
+                        import serial
                         self.socket = serial.Serial(macAddress, 115200)
                         self.serial = True
                     time.sleep(2)
@@ -329,6 +329,12 @@ class BITalino(object):
             reader = self.socket.read
         else:
             reader = self.socket.recv
+        decode = self.decode
+        
+        # time reception and decoding separately when profiling (see profiling.py)
+        if self.profile is not None:
+            reader = self.profile.timed("read;device_read", reader)
+            decode = self.profile.timed("read;decode", decode)
         
         # get data according to the value nSamples set
         dataAcquired = numpy.zeros((5 + nChannels, nSamples))
@@ -338,7 +344,7 @@ class BITalino(object):
             while len(Data) < self.number_bytes:
                 Data += reader(1)
             else:
-                decoded = self.decode(Data)
+                decoded = decode(Data)
                 if len(decoded) != 0: 
                     dataAcquired[:, sampleIndex] = decoded.T
                     Data = b''
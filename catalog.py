@@ -0,0 +1,401 @@
+"""
+Catálogo local de sesiones (SQLite) con resúmenes precalculados.
+
+CatalogSink resume cada grabación mientras se escribe y, al cerrarse el
+fichero, guarda en el catálogo una fila por sesión y otra por hora con el
+número de muestras, las tramas perdidas (saltos del número de secuencia;
+NULL, "n/a" en el informe, si la fuente no da números de secuencia reales),
+estadísticas por canal y los episodios detectados (número, duración y
+clase). Así las preguntas del tipo "episodios por hora del paciente X en el
+último mes" se responden desde los resúmenes sin volver a leer la señal.
+
+Uso:
+    python catalog.py add grabaciones/data_*.csv --patient P01   # sesiones ya grabadas
+    python catalog.py report --patient P01 --days 30
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import datetime
+
+import numpy
+
+from pipeline import CHANNEL_NAMES, channel_index
+
+CLASSES = ("phasic", "tonic", "mixed", "isolated")
+
+
+class Catalog:
+
+    def __init__(self, path="catalog.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS sessions ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " patient TEXT, device TEXT, path TEXT UNIQUE,"
+            " start REAL NOT NULL, end REAL NOT NULL, sampling_rate REAL NOT NULL, channels TEXT NOT NULL,"
+            " samples INTEGER NOT NULL, dropped_frames INTEGER,"
+            " episodes INTEGER NOT NULL, episode_seconds REAL NOT NULL, classes TEXT NOT NULL, stats TEXT NOT NULL);"
+            "CREATE INDEX IF NOT EXISTS sessions_patient ON sessions (patient, start);"
+            "CREATE TABLE IF NOT EXISTS hours ("
+            " session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE, hour REAL NOT NULL,"
+            " samples INTEGER NOT NULL, dropped_frames INTEGER,"
+            " episodes INTEGER NOT NULL, episode_seconds REAL NOT NULL, stats TEXT NOT NULL,"
+            " PRIMARY KEY (session_id, hour));"
+            "CREATE TABLE IF NOT EXISTS episodes ("
+            " session_id INTEGER NOT NULL REFERENCES sessions (id) ON DELETE CASCADE,"
+            " start REAL NOT NULL, end REAL NOT NULL, duration REAL NOT NULL, peak REAL, class TEXT);"
+            "CREATE INDEX IF NOT EXISTS episodes_session ON episodes (session_id, start);"
+        )
+        self.conn.execute("PRAGMA foreign_keys=ON")
+
+    def add_session(self, summary):
+        """Guarda el resumen de una sesión (ver SessionSummary.record); si la ruta ya estaba, la sustituye."""
+        session = summary["session"]
+        with self.lock:
+            self.conn.execute("BEGIN")
+            if session["path"] is not None:
+                self.conn.execute("DELETE FROM sessions WHERE path = ?", (session["path"],))
+            cursor = self.conn.execute(
+                "INSERT INTO sessions (patient, device, path, start, end, sampling_rate, channels, samples,"
+                " dropped_frames, episodes, episode_seconds, classes, stats)"
+                " VALUES (:patient, :device, :path, :start, :end, :sampling_rate, :channels, :samples,"
+                " :dropped_frames, :episodes, :episode_seconds, :classes, :stats)", session)
+            session_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO hours (session_id, hour, samples, dropped_frames, episodes, episode_seconds, stats)"
+                " VALUES (:session_id, :hour, :samples, :dropped_frames, :episodes, :episode_seconds, :stats)",
+                [dict(hour, session_id=session_id) for hour in summary["hours"]])
+            self.conn.executemany(
+                "INSERT INTO episodes (session_id, start, end, duration, peak, class) VALUES (?, ?, ?, ?, ?, ?)",
+                [(session_id, e["start"], e["end"], e["duration"], e["peak"], e["class"]) for e in summary["episodes"]])
+            self.conn.execute("COMMIT")
+        return session_id
+
+    def select(self, table, patient=None, since=None, until=None):
+        column = "start" if table == "sessions" else "hour"
+        query = ("SELECT s.patient AS patient, s.device AS device, s.path AS path, t.* FROM %s t"
+                 " JOIN sessions s ON s.id = %s WHERE 1" % (table, "t.id" if table == "sessions" else "t.session_id"))
+        params = []
+        if patient is not None:
+            query += " AND s.patient = ?"
+            params.append(patient)
+        if since is not None:
+            query += " AND t.%s >= ?" % column
+            params.append(since)
+        if until is not None:
+            query += " AND t.%s < ?" % column
+            params.append(until)
+        with self.lock:
+            return self.conn.execute(query + " ORDER BY t.%s" % column, params).fetchall()
+
+    def sessions(self, patient=None, since=None, until=None):
+        """Sesiones (dicts) con sus totales, tasa de episodios y estadísticas por canal."""
+        result = []
+        for row in self.select("sessions", patient, since, until):
+            session = dict(row)
+            hours = session["samples"] / session["sampling_rate"] / 3600.0
+            session["channels"] = json.loads(session["channels"])
+            session["classes"] = json.loads(session["classes"])
+            session["stats"] = channel_stats(json.loads(session["stats"]))
+            session["hours"] = hours
+            session["episodes_per_hour"] = session["episodes"] / hours if hours else 0.0
+            result.append(session)
+        return result
+
+    def hourly(self, patient=None, since=None, until=None):
+        """Resumen de cada hora de reloj (sumando las sesiones que la cubran)."""
+        hours = {}
+        for row in self.select("hours", patient, since, until):
+            hour = hours.setdefault(row["hour"], {"hour": row["hour"], "samples": 0, "dropped_frames": None,
+                                                  "episodes": 0, "episode_seconds": 0.0, "stats": {}})
+            for key in ("samples", "episodes", "episode_seconds"):
+                hour[key] += row[key]
+            if row["dropped_frames"] is not None:
+                # Solo suman las sesiones con números de secuencia reales
+                hour["dropped_frames"] = (hour["dropped_frames"] or 0) + row["dropped_frames"]
+            merge_stats(hour["stats"], json.loads(row["stats"]))
+        for hour in hours.values():
+            hour["stats"] = channel_stats(hour["stats"])
+        return [hours[key] for key in sorted(hours)]
+
+    def episodes(self, patient=None, since=None, until=None):
+        query = "SELECT s.patient AS patient, e.* FROM episodes e JOIN sessions s ON s.id = e.session_id WHERE 1"
+        params = []
+        if patient is not None:
+            query += " AND s.patient = ?"
+            params.append(patient)
+        if since is not None:
+            query += " AND e.start >= ?"
+            params.append(since)
+        if until is not None:
+            query += " AND e.start < ?"
+            params.append(until)
+        with self.lock:
+            return [dict(row) for row in self.conn.execute(query + " ORDER BY e.start", params)]
+
+    def patients(self):
+        with self.lock:
+            return [row[0] for row in self.conn.execute(
+                "SELECT DISTINCT patient FROM sessions WHERE patient IS NOT NULL ORDER BY patient")]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+def merge_stats(total, stats):
+    """Acumula en `total` las sumas por canal de `stats` (count, sum, sumsq, min, max)."""
+    for name, s in stats.items():
+        if name not in total:
+            total[name] = dict(s)
+            continue
+        t = total[name]
+        t["count"] += s["count"]
+        t["sum"] += s["sum"]
+        t["sumsq"] += s["sumsq"]
+        t["min"] = min(t["min"], s["min"])
+        t["max"] = max(t["max"], s["max"])
+    return total
+
+
+def channel_stats(sums):
+    """Media, desviación, mínimo y máximo por canal a partir de las sumas."""
+    stats = {}
+    for name, s in sums.items():
+        mean = s["sum"] / s["count"] if s["count"] else 0.0
+        variance = max(s["sumsq"] / s["count"] - mean ** 2, 0.0) if s["count"] else 0.0
+        stats[name] = {"mean": mean, "std": variance ** 0.5, "min": s["min"], "max": s["max"]}
+    return stats
+
+
+class SessionSummary:
+    """
+    Acumula muestras, tramas perdidas, estadísticas y episodios de una sesión,
+    por horas. Con `sequence` False (fuentes que numeran las muestras seguidas,
+    como ReplaySource) las tramas perdidas se guardan como desconocidas.
+    """
+
+    def __init__(self, channels, sampling_rate, patient=None, device=None, path=None, sequence=True):
+        self.channels = list(channels)
+        self.sampling_rate = sampling_rate
+        self.patient = patient
+        self.device = device
+        self.path = path
+        self.sequence = sequence
+        self.start = None
+        self.end = None
+        self.hours = {}
+        self.episodes = []
+        self.last_sequence = None
+
+    def hour(self, key):
+        return self.hours.setdefault(key, {"hour": key, "samples": 0, "dropped_frames": 0, "episodes": 0,
+                                           "episode_seconds": 0.0, "stats": {}})
+
+    def add_block(self, block, data):
+        """`data` son los canales (canales, muestras) del bloque."""
+        t = block.timestamps()
+        if self.start is None:
+            self.start = float(t[0])
+        self.end = float(t[-1]) + 1.0 / block.sampling_rate
+
+        if self.sequence:
+            # Tramas perdidas: saltos del número de secuencia (4 bits) dentro y entre bloques
+            sequence = block.data[0]
+            if self.last_sequence is not None:
+                sequence = numpy.concatenate(([self.last_sequence], sequence))
+            dropped = int(((numpy.diff(sequence) - 1) % 16).sum())
+            self.last_sequence = block.data[0, -1]
+            self.hour(hour_of(t[0]))["dropped_frames"] += dropped
+
+        keys = numpy.floor(t / 3600.0) * 3600.0
+        for key in numpy.unique(keys):
+            part = data[:, keys == key]
+            hour = self.hour(float(key))
+            hour["samples"] += part.shape[1]
+            merge_stats(hour["stats"], {
+                name: {"count": part.shape[1], "sum": float(row.sum()), "sumsq": float((row ** 2).sum()),
+                       "min": float(row.min()), "max": float(row.max())}
+                for name, row in zip(self.channels, part)})
+
+        self.add_events(block.results.get("episodes"))
+
+    def add_events(self, events):
+        for event in events or ():
+            if event["event"] == "episode":
+                self.episodes.append(event)
+                hour = self.hour(hour_of(event["start"]))
+                hour["episodes"] += 1
+                hour["episode_seconds"] += event["duration"]
+
+    def record(self):
+        """Resumen listo para Catalog.add_session (None si la sesión está vacía)."""
+        if self.start is None:
+            return None
+        hours = [self.hours[key] for key in sorted(self.hours)]
+        stats = {}
+        for hour in hours:
+            merge_stats(stats, hour["stats"])
+        session = {
+            "patient": self.patient,
+            "device": self.device,
+            "path": self.path,
+            "start": self.start,
+            "end": self.end,
+            "sampling_rate": self.sampling_rate,
+            "channels": json.dumps(self.channels),
+            "samples": sum(hour["samples"] for hour in hours),
+            "dropped_frames": sum(hour["dropped_frames"] for hour in hours) if self.sequence else None,
+            "episodes": len(self.episodes),
+            "episode_seconds": sum(e["duration"] for e in self.episodes),
+            "classes": json.dumps(Counter(e["class"] for e in self.episodes)),
+            "stats": json.dumps(stats),
+        }
+        if not self.sequence:
+            hours = [dict(hour, dropped_frames=None) for hour in hours]
+        return {"session": session,
+                "hours": [dict(hour, stats=json.dumps(hour["stats"])) for hour in hours],
+                "episodes": self.episodes}
+
+
+def hour_of(t):
+    return float(numpy.floor(t / 3600.0) * 3600.0)
+
+
+class CatalogSink:
+    """
+    Sumidero que resume la sesión y la guarda en el catálogo al cerrarse.
+
+    Con `recorder` (un CsvSink o BinarySink anterior en la lista de sumideros)
+    cada fichero grabado es una sesión y se guarda al rotar; si no, la sesión
+    es toda la adquisición (o `path`, si se está catalogando un fichero).
+    Los episodios salen de `block.results['episodes']` (DetectorStage). Con
+    `sequence` False no se cuentan tramas perdidas (ver SessionSummary).
+    """
+
+    def __init__(self, catalog="catalog.db", channels=("A0", "A1", "A2", "A3"), patient=None, device=None,
+                 recorder=None, path=None, sequence=True):
+        # Si se pasa un Catalog ya abierto lo cierra quien lo abrió
+        self.owns_catalog = isinstance(catalog, str)
+        self.catalog = Catalog(catalog) if self.owns_catalog else catalog
+        self.channels = [CHANNEL_NAMES[channel_index(c)] for c in channels]
+        self.analog_channels = self.channels
+        self.patient = patient
+        self.device = device
+        self.recorder = recorder
+        self.path = path
+        self.sequence = sequence
+        self.summary = None
+
+    def current_path(self):
+        if self.recorder is not None and self.recorder.file is not None:
+            return os.path.abspath(self.recorder.file.name)
+        return self.path
+
+    def write(self, block):
+        path = self.current_path()
+        if self.summary is not None and self.summary.path != path:
+            self.save()
+        if self.summary is None:
+            self.summary = SessionSummary(self.channels, block.sampling_rate, self.patient, self.device, path,
+                                          self.sequence)
+        self.summary.add_block(block, block.analog(self.channels))
+
+    def write_results(self, results):
+        # Episodio que seguía abierto al acabar la adquisición
+        if self.summary is not None:
+            self.summary.add_events(results.get("episodes"))
+
+    def save(self):
+        summary, self.summary = self.summary, None
+        record = summary.record() if summary is not None else None
+        if record is not None:
+            self.catalog.add_session(record)
+
+    def close(self):
+        self.save()
+        if self.owns_catalog:
+            self.catalog.close()
+
+
+def add_recording(catalog, path, patient=None, device=None, sampling_rate=1000, n_samples=1000):
+    """Cataloga una grabación ya terminada pasándola por el filtrado y el detector de tiempo real."""
+    from detector import DetectorStage
+    from emg_filters import EMGFilterStage
+    from pipeline import Pipeline
+    from replay import ReplaySource
+
+    source = ReplaySource([path], speed=0, sampling_rate=sampling_rate)
+    names = source.channel_names
+    emg = [name for name in names if name in ("A0", "A1", "A2", "A3")]
+    # ReplaySource numera las muestras seguidas: las tramas perdidas no se pueden saber
+    sink = CatalogSink(catalog, emg, patient, device, path=os.path.abspath(path), sequence=False)
+    pipeline = Pipeline(source, source.sampling_rate, n_samples, source.analogChannels,
+                        stages=[EMGFilterStage(emg, source.sampling_rate), DetectorStage(source.sampling_rate)],
+                        sinks=[sink])
+    pipeline.start()
+    pipeline.join()
+
+
+def report(catalog, patient=None, since=None, until=None):
+    """Informe de texto: una línea por sesión y los totales del periodo."""
+    sessions = catalog.sessions(patient, since, until)
+    lines = [f"{'inicio':<17} {'paciente':<10} {'horas':>6} {'episodios':>9} {'/hora':>6} "
+             f"{'dur. media':>10} {'perdidas':>8}  clases"]
+    for s in sessions:
+        mean_duration = s["episode_seconds"] / s["episodes"] if s["episodes"] else 0.0
+        if s["dropped_frames"] is None:
+            lost = f"{'n/a':>8}"
+        else:
+            lost = f"{100.0 * s['dropped_frames'] / max(s['samples'] + s['dropped_frames'], 1):7.2f}%"
+        classes = " ".join(f"{name}={s['classes'].get(name, 0)}" for name in CLASSES)
+        lines.append(f"{datetime.fromtimestamp(s['start']):%Y-%m-%d %H:%M} {s['patient'] or '-':<10} "
+                     f"{s['hours']:6.2f} {s['episodes']:9d} {s['episodes_per_hour']:6.1f} "
+                     f"{mean_duration:9.1f}s {lost}  {classes}")
+    hours = sum(s["hours"] for s in sessions)
+    episodes = sum(s["episodes"] for s in sessions)
+    lines.append(f"{len(sessions)} sesiones, {hours:.1f} h, {episodes} episodios "
+                 f"({episodes / hours if hours else 0.0:.1f}/h)")
+    return "\n".join(lines)
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Catálogo de sesiones grabadas")
+    parser.add_argument("--catalog", default="catalog.db")
+    commands = parser.add_subparsers(dest="command", required=True)
+    add_parser = commands.add_parser("add", help="cataloga grabaciones ya terminadas")
+    add_parser.add_argument("paths", nargs="+")
+    add_parser.add_argument("--patient")
+    add_parser.add_argument("--device")
+    report_parser = commands.add_parser("report", help="resumen por sesión de un periodo")
+    report_parser.add_argument("--patient")
+    report_parser.add_argument("--days", type=float, help="solo los últimos N días")
+    report_parser.add_argument("--hourly", action="store_true", help="añade el detalle por horas")
+    args = parser.parse_args()
+
+    catalog = Catalog(args.catalog)
+    if args.command == "add":
+        for path in args.paths:
+            add_recording(catalog, path, args.patient, args.device)
+            print("Catalogada:", path)
+    else:
+        since = time.time() - args.days * 86400 if args.days else None
+        print(report(catalog, args.patient, since))
+        if args.hourly:
+            for hour in catalog.hourly(args.patient, since):
+                dropped = "n/a" if hour["dropped_frames"] is None else hour["dropped_frames"]
+                print(f"{datetime.fromtimestamp(hour['hour']):%Y-%m-%d %H:00} {hour['samples']:9d} muestras "
+                      f"{hour['episodes']:4d} episodios {hour['episode_seconds']:7.1f} s "
+                      f"{dropped:>6} perdidas")
+    catalog.close()
@@ -0,0 +1,201 @@
+"""
+Detector incremental de episodios de bruxismo sobre la envolvente EMG.
+
+Se ejecuta bloque a bloque después de EMGFilterStage. Mantiene una línea base
+adaptativa (mediana y MAD de las muestras en reposo, suavizadas con una
+constante de tiempo `baseline_tau`) y detecta ráfagas con histéresis:
+empiezan al superar baseline + k_on * dispersión y acaban al bajar de
+baseline + k_off * dispersión. Las ráfagas más cortas que `min_duration` se
+descartan y las separadas menos de `merge_gap` segundos forman un episodio,
+que se clasifica como fásico, tónico o mixto (criterios AASM: ráfagas fásicas
+de 0.25-2 s, al menos 3 en un episodio fásico; tónico si alguna dura más de 2 s).
+
+Eventos (en `block.results['episodes']`):
+    {"event": "onset", "start": t}                   en cuanto se confirma una ráfaga
+    {"event": "episode", "start", "end", "duration", "peak", "rms", "bursts", "class"}
+"""
+
+import math
+
+import numpy
+
+from pipeline import CHANNEL_NAMES, channel_index
+
+
+class BruxismDetector:
+
+    def __init__(self, sampling_rate=1000, channels=("A0", "A1", "A2", "A3"), baseline_tau=60.0,
+                 k_on=6.0, k_off=3.0, min_spread=1.0, min_duration=0.25, merge_gap=3.0,
+                 tonic_duration=2.0, min_phasic_bursts=3):
+        self.sampling_rate = sampling_rate
+        self.channels = [CHANNEL_NAMES[channel_index(c)] for c in channels]
+        self.baseline_tau = baseline_tau
+        self.k_on = k_on
+        self.k_off = k_off
+        self.min_spread = min_spread
+        self.min_duration = min_duration
+        self.merge_gap = merge_gap
+        self.tonic_duration = tonic_duration
+        self.min_phasic_bursts = min_phasic_bursts
+        self.baseline = None
+        self.spread = None
+        self.active = False
+        self.burst = None
+        self.episode = None
+
+    def thresholds(self):
+        spread = max(self.spread, self.min_spread)
+        return self.baseline + self.k_on * spread, self.baseline + self.k_off * spread
+
+    def update_baseline(self, activation, state):
+        rest = activation[state == 0]
+        if len(rest) < len(activation) // 2:
+            # Bloque casi todo en actividad: no se adapta la línea base
+            return
+        median = numpy.median(rest)
+        spread = 1.4826 * numpy.median(numpy.abs(rest - median))
+        if self.baseline is None:
+            self.baseline, self.spread = median, spread
+            return
+        alpha = 1.0 - math.exp(-len(activation) / (self.sampling_rate * self.baseline_tau))
+        self.baseline += alpha * (median - self.baseline)
+        self.spread += alpha * (spread - self.spread)
+
+    def hysteresis(self, activation):
+        """Estado (0/1) de cada muestra, vectorizado: cada muestra hereda la última marca."""
+        on, off = self.thresholds()
+        n = len(activation)
+        mark = numpy.full(n + 1, -1, dtype=numpy.int8)
+        mark[0] = int(self.active)
+        mark[1:][activation < off] = 0
+        mark[1:][activation > on] = 1
+        last = numpy.where(mark >= 0, numpy.arange(n + 1), 0)
+        numpy.maximum.accumulate(last, out=last)
+        return mark[last][1:]
+
+    def classify(self, bursts):
+        tonic = any(d > self.tonic_duration for d in bursts)
+        phasic = sum(1 for d in bursts if d <= self.tonic_duration) >= self.min_phasic_bursts
+        if tonic and phasic:
+            return "mixed"
+        if tonic:
+            return "tonic"
+        if phasic:
+            return "phasic"
+        return "isolated"
+
+    def finish_episode(self, events):
+        episode = self.episode
+        self.episode = None
+        rms = numpy.sqrt(episode["sumsq"] / max(episode["n"], 1))
+        events.append({
+            "event": "episode",
+            "start": episode["start"],
+            "end": episode["end"],
+            "duration": episode["end"] - episode["start"],
+            "peak": episode["peak"],
+            "rms": dict(zip(self.channels, rms.tolist())),
+            "bursts": len(episode["bursts"]),
+            "class": self.classify(episode["bursts"]),
+        })
+
+    def confirm_burst(self, events):
+        burst = self.burst
+        burst["confirmed"] = True
+        if self.episode is not None and burst["start"] - self.episode["end"] > self.merge_gap:
+            self.finish_episode(events)
+        if self.episode is None:
+            self.episode = {"start": burst["start"], "end": burst["start"], "peak": 0.0,
+                            "sumsq": 0.0, "n": 0, "bursts": []}
+            events.append({"event": "onset", "start": burst["start"]})
+
+    def close_burst(self, end):
+        burst = self.burst
+        self.burst = None
+        if not burst["confirmed"]:
+            return
+        episode = self.episode
+        episode["end"] = end
+        episode["peak"] = max(episode["peak"], burst["peak"])
+        episode["sumsq"] = episode["sumsq"] + burst["sumsq"]
+        episode["n"] += burst["n"]
+        episode["bursts"].append(end - burst["start"])
+
+    def process_envelope(self, t0, envelope, filtered):
+        """
+        Procesa un bloque (canales, muestras) de envolvente y señal filtrada que
+        empieza en t0 (s). Devuelve la lista de eventos generados.
+        """
+        events = []
+        activation = envelope.mean(axis=0)
+        n = len(activation)
+        if self.baseline is None:
+            self.update_baseline(activation, numpy.zeros(n, dtype=numpy.int8))
+        state = self.hysteresis(activation)
+
+        # Tramos activos del bloque como (inicio, fin); el último puede seguir abierto
+        edges = numpy.diff(numpy.concatenate(([int(self.active)], state, [0])))
+        starts = numpy.flatnonzero(edges == 1)
+        ends = numpy.flatnonzero(edges == -1)
+        if self.active:
+            starts = numpy.concatenate(([0], starts))
+        min_samples = self.min_duration * self.sampling_rate
+        for s, e in zip(starts, ends):
+            if s == e:
+                # La ráfaga del bloque anterior acabó justo en el límite entre bloques
+                self.close_burst(t0)
+                continue
+            if self.burst is None:
+                self.burst = {"start": t0 + s / self.sampling_rate, "peak": 0.0, "sumsq": 0.0,
+                              "n": 0, "confirmed": False}
+            burst = self.burst
+            burst["peak"] = max(burst["peak"], float(activation[s:e].max()))
+            burst["sumsq"] = burst["sumsq"] + (filtered[:, s:e] ** 2).sum(axis=1)
+            burst["n"] += e - s
+            if not burst["confirmed"] and burst["n"] >= min_samples:
+                self.confirm_burst(events)
+            if e < n:
+                self.close_burst(t0 + e / self.sampling_rate)
+        self.active = bool(state[-1])
+
+        end = t0 + n / self.sampling_rate
+        if self.episode is not None and not self.active and end - self.episode["end"] > self.merge_gap:
+            self.finish_episode(events)
+        self.update_baseline(activation, state)
+        return events
+
+    def flush(self, end):
+        """Cierra la ráfaga y el episodio abiertos cuando la señal acaba en `end` (s)."""
+        events = []
+        if self.burst is not None:
+            self.close_burst(end)
+        self.active = False
+        if self.episode is not None:
+            self.finish_episode(events)
+        return events
+
+
+class DetectorStage:
+    """
+    Etapa del pipeline: necesita EMGFilterStage antes y deja `block.results['episodes']`.
+    Al cerrarse entrega el episodio que siguiera abierto (ver Pipeline.process_blocks).
+    """
+
+    def __init__(self, sampling_rate=1000, **kwargs):
+        self.detector = None
+        self.sampling_rate = sampling_rate
+        self.kwargs = kwargs
+        self.end = None
+
+    def process(self, block):
+        if self.detector is None:
+            self.detector = BruxismDetector(self.sampling_rate, block.results["emg_channels"], **self.kwargs)
+        block.results["episodes"] = self.detector.process_envelope(
+            block.t0, block.results["emg_envelope"], block.results["emg_filtered"])
+        self.end = block.t0 + block.duration
+
+    def close(self):
+        if self.detector is None:
+            return None
+        events = self.detector.flush(self.end)
+        return {"episodes": events} if events else None
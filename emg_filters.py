@@ -0,0 +1,93 @@
+"""
+Filtrado EMG en streaming con estado persistente entre bloques.
+
+Cada filtro es una cascada de secciones de segundo orden (SOS) que conserva
+su estado por canal, así que filtrar bloque a bloque da el mismo resultado
+que filtrar la señal completa, sin saltos cada 1000 muestras.
+"""
+
+import numpy
+from scipy import signal
+
+
+class SOSFilter:
+    """Filtro SOS multicanal con estado; procesa bloques (canales, muestras)."""
+
+    def __init__(self, sos):
+        self.sos = numpy.asarray(sos, dtype=float)
+        self.zi = None
+
+    def reset(self):
+        self.zi = None
+
+    def process(self, x):
+        if self.zi is None or self.zi.shape[1] != x.shape[0]:
+            # Estado inicial en régimen permanente para el primer valor de cada canal:
+            # evita el transitorio de arranque por el offset de ~512 del ADC
+            zi = signal.sosfilt_zi(self.sos)
+            self.zi = zi[:, numpy.newaxis, :] * x[numpy.newaxis, :, 0, numpy.newaxis]
+        y, self.zi = signal.sosfilt(self.sos, x, axis=1, zi=self.zi)
+        return y
+
+
+class EMGFilterChain:
+    """
+    Paso banda -> notch -> rectificación -> envolvente (paso bajo).
+
+    Kwargs:
+        sampling_rate (int): frecuencia de muestreo (Hz)
+        bandpass (tuple): (corte inferior, corte superior) en Hz, o None
+        order (int): orden del Butterworth paso banda
+        notch (float): frecuencia de red a eliminar (Hz), o None
+        notch_q (float): factor de calidad del notch
+        envelope_cutoff (float): corte del paso bajo de la envolvente (Hz), o None
+    """
+
+    def __init__(self, sampling_rate=1000, bandpass=(20.0, 450.0), order=4, notch=50.0, notch_q=30.0,
+                 envelope_cutoff=5.0, envelope_order=2):
+        self.filters = []
+        if bandpass is not None:
+            self.filters.append(SOSFilter(signal.butter(order, bandpass, btype="bandpass", fs=sampling_rate, output="sos")))
+        if notch is not None:
+            b, a = signal.iirnotch(notch, notch_q, fs=sampling_rate)
+            self.filters.append(SOSFilter(signal.tf2sos(b, a)))
+        self.envelope = None
+        if envelope_cutoff is not None:
+            self.envelope = SOSFilter(signal.butter(envelope_order, envelope_cutoff, btype="lowpass", fs=sampling_rate, output="sos"))
+
+    def reset(self):
+        for f in self.filters:
+            f.reset()
+        if self.envelope is not None:
+            self.envelope.reset()
+
+    def process(self, x):
+        """
+        Filtra un bloque (canales, muestras).
+
+        Output: (señal filtrada, envolvente); la envolvente es None si no se configuró
+        """
+        y = numpy.asarray(x, dtype=float)
+        for f in self.filters:
+            y = f.process(y)
+        if self.envelope is None:
+            return y, None
+        return y, self.envelope.process(numpy.abs(y))
+
+
+class EMGFilterStage:
+    """
+    Etapa del pipeline que filtra los canales EMG de cada bloque y deja
+    `block.results['emg_filtered']` y `block.results['emg_envelope']`.
+    """
+
+    def __init__(self, channels=("A0", "A1", "A2", "A3"), sampling_rate=1000, **kwargs):
+        self.channels = list(channels)
+        self.analog_channels = self.channels
+        self.chain = EMGFilterChain(sampling_rate, **kwargs)
+
+    def process(self, block):
+        filtered, envelope = self.chain.process(block.analog(self.channels))
+        block.results["emg_channels"] = self.channels
+        block.results["emg_filtered"] = filtered
+        block.results["emg_envelope"] = envelope
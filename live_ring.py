@@ -0,0 +1,257 @@
+"""
+Señal en directo en memoria compartida para herramientas locales.
+
+La adquisición publica los últimos `seconds` segundos de los canales en un
+anillo de multiprocessing.shared_memory; cualquier número de procesos locales
+(una gráfica junto a la cama, una herramienta de calibración...) lo mapea y
+lee sin copias a través del sistema de ficheros ni de ThingsBoard, y sin
+cargar al proceso de adquisición, que solo copia cada bloque una vez.
+
+No hay cerrojos: el único escritor incrementa un contador de secuencia antes
+y después de escribir (impar = escritura en curso) y los lectores repiten la
+lectura si el contador ha cambiado mientras copiaban.
+
+Disposición de la memoria:
+    cabecera (64 bytes): mágica, secuencia, muestras escritas, frecuencia,
+                         nº de canales, capacidad, canales (uint8 x 8),
+                         pid del escritor
+    instantes: float64 (capacidad,)
+    datos:     float32 (canales, capacidad)
+
+Uso desde otro proceso:
+    ring = LiveRingReader("bruxism_live")
+    t, data = ring.latest(2000)            # últimos 2 s, (canales, muestras)
+    position, t, data = ring.since(position)   # solo lo nuevo desde la última lectura
+"""
+
+import os
+import time
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy
+
+from pipeline import CHANNEL_NAMES, channel_index
+
+MAGIC = b"BRXRING1"
+HEADER_SIZE = 64
+
+
+def layout(buf, n_channels, capacity):
+    """Vistas numpy (contadores, instantes, datos) sobre el buffer compartido."""
+    counters = numpy.ndarray((2,), dtype=numpy.uint64, buffer=buf, offset=8)
+    times = numpy.ndarray((capacity,), dtype=numpy.float64, buffer=buf, offset=HEADER_SIZE)
+    data = numpy.ndarray((n_channels, capacity), dtype=numpy.float32, buffer=buf,
+                         offset=HEADER_SIZE + 8 * capacity)
+    return counters, times, data
+
+
+class LiveRing:
+    """Lado escritor: lo crea (y lo borra al cerrar) el proceso de adquisición."""
+
+    def __init__(self, name, channels, sampling_rate=1000, seconds=30):
+        self.name = name
+        self.channels = [channel_index(c) for c in channels]
+        self.capacity = int(seconds * sampling_rate)
+        size = HEADER_SIZE + self.capacity * (8 + 4 * len(self.channels))
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            # Restos de una ejecución anterior que no pudo cerrar (p. ej. tras un fallo)
+            remove_stale(name)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        buf = self.shm.buf
+        buf[:8] = MAGIC
+        numpy.ndarray((1,), dtype=numpy.float64, buffer=buf, offset=24)[0] = sampling_rate
+        numpy.ndarray((2,), dtype=numpy.uint32, buffer=buf, offset=32)[:] = (len(self.channels), self.capacity)
+        numpy.ndarray((8,), dtype=numpy.uint8, buffer=buf, offset=40)[:len(self.channels)] = self.channels
+        numpy.ndarray((1,), dtype=numpy.uint64, buffer=buf, offset=48)[0] = os.getpid()
+        self.counters, self.times, self.data = layout(buf, len(self.channels), self.capacity)
+        self.counters[:] = 0
+
+    def write(self, timestamps, data):
+        """Añade (muestras,) instantes y (canales, muestras) datos."""
+        n = data.shape[1]
+        written = int(self.counters[1])
+        if n > self.capacity:
+            # Solo caben las últimas `capacidad` muestras, pero la posición avanza las `n`
+            written += n - self.capacity
+            timestamps, data, n = timestamps[-self.capacity:], data[:, -self.capacity:], self.capacity
+        start = written % self.capacity
+        first = min(n, self.capacity - start)
+        self.counters[0] += 1
+        self.times[start:start + first] = timestamps[:first]
+        self.data[:, start:start + first] = data[:, :first]
+        if first < n:
+            self.times[:n - first] = timestamps[first:]
+            self.data[:, :n - first] = data[:, first:]
+        self.counters[1] = written + n
+        self.counters[0] += 1
+
+    def close(self):
+        self.counters = self.times = self.data = None
+        self.shm.close()
+        self.shm.unlink()
+
+
+class LiveRingReader:
+    """Lado lector: cualquier proceso local puede abrir el anillo por su nombre."""
+
+    def __init__(self, name):
+        self.shm = attach(name)
+        buf = self.shm.buf
+        if bytes(buf[:8]) != MAGIC:
+            self.shm.close()
+            raise ValueError("%s is not a live signal ring" % name)
+        self.sampling_rate = float(numpy.ndarray((1,), dtype=numpy.float64, buffer=buf, offset=24)[0])
+        n_channels, self.capacity = (int(v) for v in numpy.ndarray((2,), dtype=numpy.uint32, buffer=buf, offset=32))
+        self.channels = numpy.ndarray((8,), dtype=numpy.uint8, buffer=buf, offset=40)[:n_channels].tolist()
+        self.names = [CHANNEL_NAMES[c] for c in self.channels]
+        self.counters, self.times, self.data = layout(buf, n_channels, self.capacity)
+
+    @property
+    def written(self):
+        """Muestras escritas desde que se creó el anillo (posición para `since`)."""
+        return int(self.counters[1])
+
+    def view(self):
+        """
+        Vistas sin copia (instantes, datos) del anillo completo y el número de
+        muestras escritas; la muestra más reciente está en (escritas - 1) % capacidad.
+        El escritor puede sobrescribirlas en cualquier momento.
+        """
+        return self.times, self.data, self.written
+
+    def read(self, start, end):
+        """Copia coherente de las muestras [start, end), que deben seguir en el anillo."""
+        index = numpy.arange(start, end) % self.capacity
+        return self.times[index], self.data[:, index]
+
+    def consistent(self, func):
+        """Ejecuta func(escritas) hasta que no coincida con una escritura."""
+        while True:
+            sequence = int(self.counters[0])
+            if sequence % 2:
+                time.sleep(0.0001)
+                continue
+            result = func(int(self.counters[1]))
+            if int(self.counters[0]) == sequence:
+                return result
+
+    def latest(self, n):
+        """Últimas `n` muestras (o las que haya): (instantes (muestras,), datos (canales, muestras))."""
+        n = min(n, self.capacity)
+        return self.consistent(lambda written: self.read(max(0, written - n), written))
+
+    def since(self, position):
+        """
+        Muestras nuevas desde `position` (un valor anterior de `written`).
+
+        Output: (nueva posición, instantes, datos). Si el lector se ha quedado
+        atrás más que la capacidad, se pierden las más antiguas.
+        """
+        def new_samples(written):
+            start = min(max(position, written - self.capacity), written)
+            return (written,) + self.read(start, written)
+
+        return self.consistent(new_samples)
+
+    def wait(self, position, timeout=None, poll=0.001):
+        """Espera a que haya muestras posteriores a `position`; devuelve False si vence el plazo."""
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while self.written <= position:
+            if deadline is not None and time.monotonic() >= deadline:
+                return False
+            time.sleep(poll)
+        return True
+
+    def close(self):
+        self.counters = self.times = self.data = None
+        self.shm.close()
+
+
+def remove_stale(name):
+    """Borra un anillo que ya existe solo si su escritor ha terminado."""
+    stale = shared_memory.SharedMemory(name=name)
+    try:
+        buf = stale.buf
+        owner = int(numpy.ndarray((1,), dtype=numpy.uint64, buffer=buf, offset=48)[0]) \
+            if len(buf) >= HEADER_SIZE and bytes(buf[:8]) == MAGIC else None
+        if owner is None or process_alive(owner):
+            # No es nuestro o sigue en uso: que no lo borre el resource_tracker al salir. Si el
+            # escritor es este mismo proceso (dos sumideros con el mismo nombre) el registro es
+            # suyo y debe seguir ahí para que lo borre al cerrar o tras un fallo
+            if owner != os.getpid():
+                resource_tracker.unregister(stale._name, "shared_memory")
+            raise FileExistsError("Shared memory %r is in use%s" % (
+                name, "" if owner is None else " by process %d" % owner))
+    finally:
+        stale.close()
+    stale.unlink()
+
+
+def process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def attach(name):
+    shm = shared_memory.SharedMemory(name=name)
+    # Antes de Python 3.13 el resource_tracker borraría el anillo al salir el lector
+    resource_tracker.unregister(shm._name, "shared_memory")
+    return shm
+
+
+class LiveRingSink:
+    """
+    Sumidero del pipeline que publica los canales de cada bloque en un LiveRing
+    de `seconds` segundos. El anillo se crea con el primer bloque (cuando se
+    conoce la frecuencia de muestreo) y se borra al cerrar.
+    """
+
+    def __init__(self, name="bruxism_live", channels=("A0", "A1", "A2", "A3"), seconds=30, latency_target=0.1):
+        self.name = name
+        # Una gráfica en directo quiere bloques pequeños (ver adaptive.py)
+        self.latency_target = latency_target
+        self.channels = [CHANNEL_NAMES[channel_index(c)] for c in channels]
+        self.analog_channels = self.channels
+        self.seconds = seconds
+        self.ring = None
+
+    def write(self, block):
+        if self.ring is None:
+            self.ring = LiveRing(self.name, self.channels, block.sampling_rate, self.seconds)
+        self.ring.write(block.timestamps(), block.analog(self.channels))
+
+    def close(self):
+        if self.ring is not None:
+            self.ring.close()
+            self.ring = None
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Muestra la señal en directo del anillo compartido")
+    parser.add_argument("--name", default="bruxism_live")
+    parser.add_argument("--interval", type=float, default=1.0, help="segundos entre líneas")
+    args = parser.parse_args()
+
+    ring = LiveRingReader(args.name)
+    position = ring.written
+    try:
+        while True:
+            ring.wait(position)
+            time.sleep(args.interval)
+            position, t, data = ring.since(position)
+            if len(t):
+                rms = numpy.sqrt(((data - data.mean(axis=1, keepdims=True)) ** 2).mean(axis=1))
+                delay = (time.time() - t[-1]) * 1000
+                print(f"{len(t)} muestras, retraso {delay:.0f} ms, RMS "
+                      + " ".join(f"{name}={value:.1f}" for name, value in zip(ring.names, rms)))
+    except KeyboardInterrupt:
+        ring.close()
@@ -0,0 +1,145 @@
+"""
+Servidor local que imita la API de telemetría de ThingsBoard
+(POST /api/v1/{token}/telemetry) para pruebas de carga del emisor.
+
+Acepta un objeto JSON o una lista de objetos ({"ts": ..., "values": {...}} o
+valores sueltos) y permite simular latencia, errores y limitación (HTTP 429).
+
+Uso:
+    python mock_thingsboard.py --port 8953 --latency 0.05 --error-rate 0.01 --max-rps 50
+"""
+
+import argparse
+import json
+import random
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class MockThingsBoard:
+
+    def __init__(self, host="127.0.0.1", port=0, latency=0.0, error_rate=0.0, max_rps=None):
+        self.latency = latency
+        self.error_rate = error_rate
+        self.max_rps = max_rps
+        self.lock = threading.Lock()
+        self.tokens = max_rps or 0
+        self.last_refill = time.monotonic()
+        self.requests = 0
+        self.samples = 0
+        self.errors = 0
+        self.throttled = 0
+        self.by_token = {}
+        self.server = ThreadingHTTPServer((host, port), self.make_handler())
+        self.server.daemon_threads = True
+        self.thread = None
+
+    @property
+    def url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def stats(self):
+        with self.lock:
+            return {
+                "requests": self.requests,
+                "samples": self.samples,
+                "errors": self.errors,
+                "throttled": self.throttled,
+                "by_token": dict(self.by_token),
+            }
+
+    def throttle(self):
+        # Cubeta de fichas: como mucho max_rps peticiones por segundo
+        if not self.max_rps:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(self.max_rps, self.tokens + (now - self.last_refill) * self.max_rps)
+            self.last_refill = now
+            if self.tokens < 1:
+                self.throttled += 1
+                return True
+            self.tokens -= 1
+            return False
+
+    def accept(self, token, payload):
+        n = len(payload) if isinstance(payload, list) else 1
+        with self.lock:
+            self.requests += 1
+            self.samples += n
+            self.by_token[token] = self.by_token.get(token, 0) + n
+
+    def make_handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+
+            def reply(self, status, body=b""):
+                self.send_response(status)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/stats":
+                    self.reply(200, json.dumps(mock.stats()).encode())
+                else:
+                    self.reply(404)
+
+            def do_POST(self):
+                parts = self.path.strip("/").split("/")
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if len(parts) != 4 or parts[:2] != ["api", "v1"] or parts[3] != "telemetry":
+                    self.reply(404)
+                    return
+                if mock.throttle():
+                    self.reply(429)
+                    return
+                if mock.latency:
+                    time.sleep(mock.latency)
+                if mock.error_rate and random.random() < mock.error_rate:
+                    with mock.lock:
+                        mock.errors += 1
+                    self.reply(500)
+                    return
+                try:
+                    payload = json.loads(body)
+                except ValueError:
+                    self.reply(400)
+                    return
+                mock.accept(parts[2], payload)
+                self.reply(200)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Servidor ThingsBoard simulado")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8953)
+    parser.add_argument("--latency", type=float, default=0.0, help="segundos de retardo por petición")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="fracción de peticiones que devuelven 500")
+    parser.add_argument("--max-rps", type=float, default=None, help="peticiones/s antes de devolver 429")
+    args = parser.parse_args()
+
+    mock = MockThingsBoard(args.host, args.port, args.latency, args.error_rate, args.max_rps)
+    print("ThingsBoard simulado en", mock.url)
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        mock.server.server_close()
+        print(mock.stats())
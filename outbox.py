@@ -0,0 +1,231 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+from functools import partial
+
+import profiling
+from thingsboard import send_data_to_thingsboard
+
+
+class Outbox:
+    """
+    Cola persistente (SQLite en modo WAL) de telemetría pendiente de subir.
+
+    Cada entrada se inserta antes de intentar la subida y solo se borra cuando
+    ThingsBoard responde 2xx, de modo que un corte de red o un reinicio no
+    pierde datos. Cada entrada guarda cuántas muestras lleva para poder
+    limitar el tamaño de cada petición.
+    """
+
+    def __init__(self, path="outbox.db"):
+        self.path = path
+        self.lock = threading.Lock()
+        self.not_empty = threading.Condition(self.lock)
+        self.conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " created REAL NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_try REAL NOT NULL DEFAULT 0,"
+            " samples INTEGER NOT NULL DEFAULT 1)"
+        )
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(outbox)")]
+        if "samples" not in columns:
+            # Outbox de una versión anterior: sus entradas cuentan como una muestra
+            self.conn.execute("ALTER TABLE outbox ADD COLUMN samples INTEGER NOT NULL DEFAULT 1")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS outbox_next_try ON outbox (next_try)")
+
+    def put(self, payload):
+        self.put_many([payload])
+
+    def put_many(self, payloads):
+        now = time.time()
+        rows = [(now, json.dumps(payload), len(payload) if isinstance(payload, list) else 1) for payload in payloads]
+        trace = profiling.current_trace()
+        start = time.perf_counter() if trace is not None else 0.0
+        with self.not_empty:
+            if trace is not None:
+                trace.add("lock_wait;outbox", time.perf_counter() - start)
+            self.conn.execute("BEGIN")
+            self.conn.executemany("INSERT INTO outbox (created, payload, samples) VALUES (?, ?, ?)", rows)
+            self.conn.execute("COMMIT")
+            self.not_empty.notify_all()
+
+    def take_live(self, since, limit, max_samples=None):
+        """Entradas recientes que aún no han fallado nunca (datos en directo)."""
+        return self.take("attempts = 0 AND created >= ?", (since,), limit, max_samples)
+
+    def take_due(self, now, since, limit, max_samples=None):
+        """Entradas atrasadas (fallidas o anteriores a `since`) cuyo reintento ya toca."""
+        return self.take("next_try <= ? AND (attempts > 0 OR created < ?)", (now, since), limit, max_samples)
+
+    def take(self, where, params, limit, max_samples):
+        """Como mucho `limit` entradas y `max_samples` muestras (siempre al menos una entrada)."""
+        with self.lock:
+            counts = self.conn.execute(
+                "SELECT id, samples FROM outbox WHERE %s ORDER BY id LIMIT ?" % where, params + (limit,)).fetchall()
+            last, total = None, 0
+            for row_id, samples in counts:
+                if max_samples is not None and last is not None and total + samples > max_samples:
+                    break
+                last, total = row_id, total + samples
+            if last is None:
+                return []
+            rows = self.conn.execute(
+                "SELECT id, payload FROM outbox WHERE %s AND id <= ? ORDER BY id LIMIT ?" % where,
+                params + (last, limit)).fetchall()
+        return [(row_id, json.loads(payload)) for row_id, payload in rows]
+
+    def ack(self, ids):
+        with self.lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany("DELETE FROM outbox WHERE id = ?", [(row_id,) for row_id in ids])
+            self.conn.execute("COMMIT")
+
+    def retry(self, ids, next_try):
+        with self.lock:
+            self.conn.execute("BEGIN")
+            self.conn.executemany(
+                "UPDATE outbox SET attempts = attempts + 1, next_try = ? WHERE id = ?",
+                [(next_try, row_id) for row_id in ids])
+            self.conn.execute("COMMIT")
+
+    def wait(self, timeout):
+        with self.not_empty:
+            self.not_empty.wait(timeout)
+
+    def wake(self):
+        with self.not_empty:
+            self.not_empty.notify_all()
+
+    def backlog(self, since):
+        """Número de entradas pendientes más antiguas que `since` o ya fallidas."""
+        with self.lock:
+            return self.conn.execute(
+                "SELECT COUNT(*) FROM outbox WHERE attempts > 0 OR created < ?", (since,)).fetchone()[0]
+
+    def __len__(self):
+        with self.lock:
+            return self.conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0]
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+
+class OutboxUploader(threading.Thread):
+    """
+    Hebra que vacía un Outbox hacia ThingsBoard.
+
+    Los datos en directo se suben en cuanto llegan; el atraso acumulado tras un
+    corte se drena como mucho a `catchup_rate` peticiones por segundo para no
+    retrasar los datos nuevos. Los fallos se reintentan con backoff exponencial
+    con jitter (entre 0 y min(max_delay, base_delay * 2**fallos)).
+
+    Cada petición lleva como mucho `batch_size` entradas y `batch_samples`
+    muestras: una entrada es un bloque, cuyo tamaño depende de la configuración.
+    """
+
+    def __init__(self, outbox, device_token, batch_size=500, catchup_rate=2.0, base_delay=1.0, max_delay=300.0,
+                 live_window=10.0, send=partial(send_data_to_thingsboard, verbose=False), profiler=None,
+                 batch_samples=5000):
+        super().__init__(daemon=True)
+        self.outbox = outbox
+        self.device_token = device_token
+        self.batch_size = batch_size
+        self.batch_samples = batch_samples
+        self.catchup_rate = catchup_rate
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.live_window = live_window
+        self.send = send
+        self.profiler = profiler
+        self.stopped = threading.Event()
+        self.failures = 0
+        self.tokens = 1.0
+        self.sent = 0
+        self.backlog_sent = 0
+        self.drain_rate = 0.0
+        self.last_drain = None
+        self.last_error = None
+
+    def stop(self):
+        self.stopped.set()
+        self.outbox.wake()
+
+    def backoff(self):
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** self.failures))
+
+    def stats(self):
+        return {
+            "pending": len(self.outbox),
+            "backlog": self.outbox.backlog(time.time() - self.live_window),
+            "sent": self.sent,
+            "backlog_sent": self.backlog_sent,
+            "drain_rate": self.drain_rate,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+    def upload(self, rows):
+        values = []
+        for _, payload in rows:
+            if isinstance(payload, list):
+                values.extend(payload)
+            else:
+                values.append(payload)
+        ids = [row_id for row_id, _ in rows]
+        start = time.perf_counter()
+        ok = self.send(values, self.device_token)
+        if self.profiler is not None:
+            self.profiler.add("upload", time.perf_counter() - start)
+        if ok:
+            self.outbox.ack(ids)
+            self.failures = 0
+            return True
+        self.failures += 1
+        self.last_error = time.time()
+        self.outbox.retry(ids, time.time() + self.backoff())
+        return False
+
+    def run(self):
+        last = time.monotonic()
+        while not self.stopped.is_set():
+            now = time.monotonic()
+            # Cubeta de fichas para limitar el ritmo de drenado del atraso
+            self.tokens = min(1.0, self.tokens + (now - last) * self.catchup_rate)
+            last = now
+
+            # El atraso gasta una ficha siempre que la haya, aunque haya datos en directo
+            # pendientes; el resto de la capacidad es para el directo
+            since = time.time() - self.live_window
+            rows = []
+            if self.tokens >= 1.0:
+                rows = self.outbox.take_due(time.time(), since, self.batch_size, self.batch_samples)
+            from_backlog = bool(rows)
+            if not rows:
+                rows = self.outbox.take_live(since, self.batch_size, self.batch_samples)
+            if not rows:
+                self.outbox.wait(0.5 if self.tokens >= 1.0 else 1.0 / self.catchup_rate)
+                continue
+
+            if from_backlog:
+                self.tokens -= 1.0
+            if self.upload(rows):
+                self.sent += len(rows)
+                if from_backlog:
+                    self.backlog_sent += len(rows)
+                    # Media móvil exponencial del ritmo de drenado (entradas/s)
+                    if self.last_drain is not None:
+                        rate = len(rows) / max(now - self.last_drain, 1e-3)
+                        self.drain_rate = 0.8 * self.drain_rate + 0.2 * rate
+                    self.last_drain = now
+            else:
+                # Sin conexión: esperar antes del siguiente intento
+                self.stopped.wait(self.backoff())
@@ -0,0 +1,294 @@
+"""
+Pipeline de adquisición por bloques.
+
+Una hebra lectora llama a `source.read(n_samples)` (un BITalino o cualquier
+objeto con la misma interfaz) y deja cada bloque en una cola acotada; una
+hebra de proceso pasa cada bloque por las etapas (`stage.process(block)`) y
+después por los sumideros (`sink.write(block)`). Al acabar, lo que las etapas
+devuelvan al cerrarse (`stage.close()`) se entrega a los sumideros con
+`sink.write_results(resultados)` antes de cerrarlos.
+
+Las etapas y sumideros que leen canales en bruto lo indican con el atributo
+`analog_channels`; `subscribed_channels` junta todos ellos para adquirir solo
+esos canales (tramas más cortas por Bluetooth y menos que decodificar).
+"""
+
+import queue
+import threading
+import time
+import traceback
+from collections import deque
+
+import numpy
+
+import profiling
+
+CHANNEL_NAMES = ["A0", "A1", "A2", "A3", "A4", "A5"]
+
+
+def channel_index(channel):
+    """Acepta 'A3' o 3 y devuelve el índice del canal analógico."""
+    if isinstance(channel, str):
+        return CHANNEL_NAMES.index(channel)
+    return int(channel)
+
+
+def subscribed_channels(components):
+    """Índices (ordenados) de los canales analógicos que leen las etapas y sumideros dados."""
+    wanted = set()
+    for component in components:
+        wanted.update(channel_index(c) for c in getattr(component, "analog_channels", ()))
+    return sorted(wanted)
+
+
+class Block:
+    """
+    Bloque de muestras tal y como lo devuelve BITalino.read: fila 0 número de
+    secuencia, filas 1-4 digitales y a partir de la 5 los canales analógicos
+    en el orden de `channels`. Las etapas dejan sus resultados en `results`.
+    """
+
+    def __init__(self, data, t0, sampling_rate, channels, index=0):
+        self.data = data
+        self.t0 = t0
+        self.sampling_rate = sampling_rate
+        self.channels = list(channels)
+        self.index = index
+        self.results = {}
+        self.trace = None
+
+    def __len__(self):
+        return self.data.shape[1]
+
+    @property
+    def duration(self):
+        return len(self) / float(self.sampling_rate)
+
+    def analog(self, channels):
+        """Filas de los canales analógicos pedidos (p. ej. ['A0', 'A1'])."""
+        rows = [5 + self.channels.index(channel_index(channel)) for channel in channels]
+        return self.data[rows, :]
+
+    def timestamps(self):
+        return self.t0 + numpy.arange(len(self)) / float(self.sampling_rate)
+
+
+class Pipeline:
+
+    def __init__(self, source, sampling_rate=1000, n_samples=1000, channels=(0, 1, 2, 3, 4, 5),
+                 stages=(), sinks=(), max_blocks=60, profiler=None, listeners=(), sub_block=20, block_size=None):
+        self.source = source
+        self.sampling_rate = sampling_rate
+        self.n_samples = n_samples
+        self.channels = [channel_index(c) for c in channels]
+        self.stages = list(stages)
+        self.sinks = list(sinks)
+        # Oyentes (p. ej. Biofeedback) que ven la señal en sub-bloques desde la hebra lectora
+        self.listeners = list(listeners)
+        missing = set(subscribed_channels(self.stages + self.sinks + self.listeners)) - set(self.channels)
+        if missing:
+            raise ValueError("Channels %s are used but not acquired" % [CHANNEL_NAMES[c] for c in sorted(missing)])
+        self.blocks = queue.Queue(maxsize=max_blocks)
+        self.stopped = threading.Event()
+        self.read_thread = threading.Thread(target=self.read_blocks, daemon=True)
+        self.process_thread = threading.Thread(target=self.process_blocks, daemon=True)
+        self.profiler = profiler
+        self.sub_block = sub_block
+        # Tamaño de bloque adaptativo (ver adaptive.py); sin él siempre n_samples
+        self.block_size = block_size
+        if block_size is not None:
+            block_size.set_consumers(self.stages + self.sinks)
+        self.next_samples = n_samples
+        self.samples_read = 0
+        self.samples_dequeued = 0
+        self.samples_processed = 0
+        # Latencia de los últimos bloques: de la primera muestra al final del proceso
+        self.latencies = deque(maxlen=1000)
+        self.blocks_read = 0
+        self.blocks_processed = 0
+        self.errors = 0
+
+    def read(self):
+        """
+        Lee un bloque de la fuente. Con oyentes se lee en sub-bloques de
+        `sub_block` muestras que se les pasan (`listener.feed(datos, canales)`)
+        en cuanto llegan, sin esperar a completar el bloque.
+
+        Output: (datos, instante de la primera muestra si la fuente lo da)
+        """
+        n_samples = self.next_samples
+        if self.block_size is not None:
+            # El bloque recién encolado aún no lo ha recogido el proceso: no cuenta como atraso
+            backlog = max(self.samples_read - self.samples_dequeued - self.next_samples, 0)
+            n_samples = self.next_samples = self.block_size.next_size(backlog)
+        if not self.listeners:
+            return self.source.read(n_samples), getattr(self.source, "last_t0", None)
+        parts = []
+        t0 = None
+        remaining = n_samples
+        while remaining > 0:
+            try:
+                part = self.source.read(min(self.sub_block, remaining))
+            except EOFError:
+                if not parts:
+                    raise
+                break
+            if not parts:
+                t0 = getattr(self.source, "last_t0", None)
+            for listener in self.listeners:
+                listener.feed(part, self.channels)
+            parts.append(part)
+            remaining -= part.shape[1]
+        return numpy.concatenate(parts, axis=1), t0
+
+    def make_block(self, data, index, t0=None):
+        # Las fuentes grabadas (ReplaySource) dan el instante original del bloque
+        if t0 is None:
+            # El último dato del bloque acaba de llegar: se reconstruye el instante del primero
+            t0 = time.time() - data.shape[1] / float(self.sampling_rate)
+        block = Block(data, t0, self.sampling_rate, self.channels, index)
+        # Instante (perf_counter) en que se adquirió la primera muestra, para medir la latencia
+        block.acquired = time.perf_counter() - data.shape[1] / float(self.sampling_rate)
+        self.samples_read += data.shape[1]
+        return block
+
+    def read_traced(self, trace, index):
+        """Como una iteración de read_blocks pero midiendo cada paso en la traza."""
+        perf_counter = time.perf_counter
+        traceable = hasattr(self.source, "profile")
+        if traceable:
+            self.source.profile = trace
+        start = perf_counter()
+        try:
+            data, t0 = self.read()
+        finally:
+            if traceable:
+                self.source.profile = None
+        trace.add("read", perf_counter() - start)
+        block = self.make_block(data, index, t0)
+        block.trace = trace
+        start = perf_counter()
+        self.blocks.put(block)
+        trace.add("enqueue_wait", perf_counter() - start)
+        trace.enqueued = perf_counter()
+
+    def read_blocks(self):
+        index = 0
+        profiler = self.profiler
+        try:
+            while not self.stopped.is_set():
+                trace = None
+                if profiler is not None:
+                    profiler.tick("reader")
+                    trace = profiler.begin(index)
+                if trace is None:
+                    data, t0 = self.read()
+                    block = self.make_block(data, index, t0)
+                    self.blocks.put(block)  # Espera si el proceso va atrasado (cola acotada)
+                else:
+                    self.read_traced(trace, index)
+                self.blocks_read += 1
+                index += 1
+        except EOFError:
+            # Fin de una fuente finita (p. ej. ReplaySource)
+            pass
+        finally:
+            for listener in self.listeners:
+                listener.close()
+            # Aunque falle la lectura (dispositivo cerrado) los sumideros se cierran
+            self.blocks.put(None)
+
+    def process_traced(self, block, trace):
+        perf_counter = time.perf_counter
+        trace.add("queued", perf_counter() - trace.enqueued)
+        profiling.current.trace = trace
+        try:
+            for stage in self.stages:
+                start = perf_counter()
+                stage.process(block)
+                trace.add("stage;" + type(stage).__name__, perf_counter() - start)
+            for sink in self.sinks:
+                start = perf_counter()
+                sink.write(block)
+                trace.add("sink;" + type(sink).__name__, perf_counter() - start)
+        finally:
+            profiling.current.trace = None
+        self.profiler.finish(trace)
+
+    def process_blocks(self):
+        while True:
+            block = self.blocks.get()
+            if block is None:
+                break
+            self.samples_dequeued += len(block)
+            start = time.perf_counter()
+            try:
+                if self.profiler is not None:
+                    self.profiler.tick("process")
+                if block.trace is None:
+                    for stage in self.stages:
+                        stage.process(block)
+                    for sink in self.sinks:
+                        sink.write(block)
+                else:
+                    self.process_traced(block, block.trace)
+            except Exception:
+                # Un bloque que falla se descarta; si la hebra muriese el lector se quedaría
+                # bloqueado con la cola llena y los ficheros no se cerrarían nunca
+                self.errors += 1
+                print("Error procesando el bloque %d:" % block.index)
+                traceback.print_exc()
+            end = time.perf_counter()
+            if self.block_size is not None:
+                self.block_size.observe(len(block), end - start)
+            self.latencies.append(end - block.acquired)
+            self.samples_processed += len(block)
+            self.blocks_processed += 1
+        # Las etapas con recursos propios (p. ej. AnalysisStage) también se cierran. Las que
+        # tienen algo pendiente (el último episodio de DetectorStage) lo devuelven al cerrarse
+        # y se pasa a los sumideros con `write_results` antes de cerrarlos
+        results = {}
+        for stage in self.stages:
+            if hasattr(stage, "close"):
+                results.update(self.close_component(stage) or {})
+        for sink in self.sinks:
+            if results and hasattr(sink, "write_results"):
+                try:
+                    sink.write_results(results)
+                except Exception:
+                    print("Error en %s.write_results:" % type(sink).__name__)
+                    traceback.print_exc()
+            self.close_component(sink)
+
+    def close_component(self, component):
+        try:
+            return component.close()
+        except Exception:
+            # Un cierre que falla no impide cerrar los demás ficheros
+            print("Error cerrando %s:" % type(component).__name__)
+            traceback.print_exc()
+            return None
+
+    def metrics(self):
+        """Tamaño de bloque actual, muestras en cola y latencia de los últimos bloques (ms)."""
+        latencies = sorted(self.latencies)
+        return {
+            "block_size": self.next_samples,
+            "queued_samples": self.samples_read - self.samples_dequeued,
+            "blocks_processed": self.blocks_processed,
+            "errors": self.errors,
+            "latency_ms": 1000 * latencies[len(latencies) // 2] if latencies else 0.0,
+            "latency_p95_ms": 1000 * latencies[int(0.95 * (len(latencies) - 1))] if latencies else 0.0,
+            "latency_max_ms": 1000 * latencies[-1] if latencies else 0.0,
+        }
+
+    def start(self):
+        self.read_thread.start()
+        self.process_thread.start()
+
+    def stop(self):
+        self.stopped.set()
+
+    def join(self, timeout=None):
+        self.read_thread.join(timeout)
+        self.process_thread.join(timeout)
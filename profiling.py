@@ -0,0 +1,170 @@
+"""
+Perfilado opcional del pipeline de adquisición.
+
+Con un Profiler, el pipeline toma 1 de cada `sample_every` bloques y registra
+en una traza cuánto tiempo pasa en cada etapa: lectura del dispositivo
+(separando recepción y decodificación si la fuente es un BITalino), espera al
+encolar y en la cola, cada etapa de proceso, cada sumidero y las esperas de
+cerrojo del Outbox. Sin Profiler (por defecto) el pipeline no mide nada.
+
+Con install_signal(), `kill -USR1 <pid>` guarda:
+    profile_<pid>_<hora>.json       trazas y totales por etapa
+    profile_<pid>_<hora>.folded     pilas colapsadas para flamegraph.pl / speedscope
+    profile_<pid>_<hora>_<hebra>.pstats  cProfile de los siguientes `cprofile_blocks`
+                                         bloques de cada hebra del pipeline
+
+Desde Python 3.12 cProfile se apoya en sys.monitoring y solo puede haber un
+perfil activo en todo el proceso: las hebras se perfilan una detrás de otra y
+cada .pstats recoge lo que hace todo el proceso durante esa captura, no solo
+la hebra que le da nombre.
+"""
+
+import cProfile
+import json
+import os
+import signal
+import sys
+import threading
+import time
+from collections import deque
+
+current = threading.local()
+
+# cProfile con sys.monitoring (3.12+): un solo perfil activo por proceso
+PROCESS_WIDE = sys.version_info >= (3, 12)
+
+
+def current_trace():
+    """Traza del bloque que está procesando esta hebra, o None."""
+    return getattr(current, "trace", None)
+
+
+class Trace:
+
+    def __init__(self, index):
+        self.index = index
+        self.started = time.time()
+        self.enqueued = None
+        self.times = {}
+
+    def add(self, name, seconds):
+        self.times[name] = self.times.get(name, 0.0) + seconds
+
+    def timed(self, name, func):
+        """Envuelve func para acumular su tiempo en `name`."""
+        perf_counter = time.perf_counter
+
+        def wrapper(*args, **kwargs):
+            start = perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.add(name, perf_counter() - start)
+
+        return wrapper
+
+
+class Profiler:
+
+    def __init__(self, sample_every=100, max_traces=1000, cprofile_blocks=10, directory="."):
+        self.sample_every = sample_every
+        self.traces = deque(maxlen=max_traces)
+        self.totals = {}
+        self.lock = threading.Lock()
+        self.cprofile_blocks = cprofile_blocks
+        self.directory = directory
+        self.armed = set()
+        self.captures = {}
+        self.dump_prefix = None
+
+    def begin(self, index):
+        if index % self.sample_every:
+            return None
+        return Trace(index)
+
+    def finish(self, trace):
+        with self.lock:
+            self.traces.append(trace)
+            for name, seconds in trace.times.items():
+                self.account(name, seconds)
+
+    def add(self, name, seconds):
+        """Tiempo que no pertenece a un bloque concreto (p. ej. la subida)."""
+        with self.lock:
+            self.account(name, seconds)
+
+    def account(self, name, seconds):
+        total = self.totals.get(name)
+        if total is None:
+            self.totals[name] = [1, seconds, seconds]
+        else:
+            total[0] += 1
+            total[1] += seconds
+            total[2] = max(total[2], seconds)
+
+    def summary(self):
+        with self.lock:
+            return {name: {"count": count, "total_s": total, "mean_ms": 1000 * total / count, "max_ms": 1000 * peak}
+                    for name, (count, total, peak) in self.totals.items()}
+
+    def folded(self):
+        """Pilas colapsadas ('bloque;etapa;subetapa microsegundos') con el tiempo propio de cada nivel."""
+        stacks = {}
+        with self.lock:
+            traces = list(self.traces)
+        for trace in traces:
+            for name, seconds in trace.times.items():
+                children = sum(s for n, s in trace.times.items() if n.startswith(name + ";") and ";" not in n[len(name) + 1:])
+                stack = "block;" + name
+                stacks[stack] = stacks.get(stack, 0.0) + max(seconds - children, 0.0)
+        return "".join(f"{stack} {int(seconds * 1e6)}\n" for stack, seconds in sorted(stacks.items()))
+
+    def dump(self, prefix=None):
+        prefix = prefix or os.path.join(self.directory, "profile_%d_%s" % (os.getpid(), time.strftime("%Y%m%d-%H%M%S")))
+        with self.lock:
+            traces = [{"index": t.index, "started": t.started, "times": t.times} for t in self.traces]
+        with open(prefix + ".json", "w") as file:
+            json.dump({"summary": self.summary(), "traces": traces}, file, indent=2)
+        with open(prefix + ".folded", "w") as file:
+            file.write(self.folded())
+        return prefix
+
+    def tick(self, thread_name):
+        """
+        Llamado por cada hebra del pipeline una vez por bloque: arranca o
+        termina la captura de cProfile que haya pedido la señal.
+        """
+        if not self.armed and not self.captures:
+            return
+        capture = self.captures.get(thread_name)
+        if capture is None:
+            with self.lock:
+                if thread_name not in self.armed or (PROCESS_WIDE and self.captures):
+                    # En 3.12+ espera a que acabe la captura de la otra hebra
+                    return
+                self.armed.discard(thread_name)
+                profile = cProfile.Profile()
+                try:
+                    profile.enable()
+                except ValueError as e:
+                    # Otro perfilador activo en el proceso: sin captura, pero sin parar la adquisición
+                    print("No se pudo perfilar la hebra %s: %s" % (thread_name, e))
+                    return
+                self.captures[thread_name] = [profile, self.cprofile_blocks]
+            return
+        capture[1] -= 1
+        if capture[1] <= 0:
+            profile = capture[0]
+            profile.disable()
+            with self.lock:
+                del self.captures[thread_name]
+            profile.dump_stats(f"{self.dump_prefix}_{thread_name}.pstats")
+
+    def request_dump(self, thread_names=("reader", "process")):
+        self.dump_prefix = self.dump()
+        self.armed.update(thread_names)
+        print("Perfil guardado en", self.dump_prefix + ".json")
+
+    def install_signal(self, signum=getattr(signal, "SIGUSR1", None)):
+        if signum is not None:
+            signal.signal(signum, lambda *_: self.request_dump())
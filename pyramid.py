@@ -0,0 +1,251 @@
+"""
+Pirámides de mínimo/máximo/media para ver noches enteras al instante.
+
+Junto a cada grabación (data_N.csv o data_N.bin) se guarda un fichero por
+nivel, data_N.csv.pyr10, .pyr100, ..., con un registro por cada `factor`
+muestras: instante de la primera muestra y mínimo, máximo y media de cada
+canal. Los sumideros los construyen mientras graban, cada nivel a partir del
+anterior, así que no hay que volver a leer la grabación para dibujarla.
+
+Cada fichero tiene una línea mágica, una línea de cabecera JSON y registros de
+tamaño fijo (ver `record_dtype`), de modo que las consultas leen con memmap
+solo los registros del intervalo pedido:
+
+    pyramid = Pyramid("data_3.bin")
+    level = pyramid.query(start, end, width=1200)   # un registro por píxel o más
+
+Para grabaciones antiguas:
+    python pyramid.py build data_*.csv
+"""
+
+import json
+import os
+
+import numpy
+
+import recordings
+
+MAGIC = b"BRXP1\n"
+FACTORS = (10, 100, 1000, 10000)
+
+
+def record_dtype(n_channels):
+    return numpy.dtype([("t", "<f8"), ("min", "<f4", (n_channels,)), ("max", "<f4", (n_channels,)),
+                        ("mean", "<f4", (n_channels,))])
+
+
+def level_path(path, factor):
+    return f"{path}.pyr{factor}"
+
+
+class Level:
+    """Un nivel en construcción: agrupa de `ratio` en `ratio` los elementos del nivel anterior."""
+
+    def __init__(self, path, factor, ratio, header):
+        self.factor = factor
+        self.ratio = ratio
+        self.file = open(path, "wb")
+        self.file.write(MAGIC)
+        self.file.write((json.dumps(dict(header, factor=factor)) + "\n").encode())
+        n_channels = len(header["channels"])
+        self.dtype = record_dtype(n_channels)
+        # Elementos pendientes de completar un grupo: instante, mínimo, máximo, suma y cuenta
+        self.t = numpy.zeros(0)
+        self.low = numpy.zeros((n_channels, 0))
+        self.high = numpy.zeros((n_channels, 0))
+        self.total = numpy.zeros((n_channels, 0))
+        self.count = numpy.zeros(0)
+
+    def add(self, t, low, high, total, count):
+        """Añade elementos y devuelve los grupos completados con la misma forma (para el nivel siguiente)."""
+        t = numpy.concatenate((self.t, t))
+        low = numpy.concatenate((self.low, low), axis=1)
+        high = numpy.concatenate((self.high, high), axis=1)
+        total = numpy.concatenate((self.total, total), axis=1)
+        count = numpy.concatenate((self.count, count))
+        groups = len(t) // self.ratio
+        used = groups * self.ratio
+        self.t, self.low, self.high = t[used:], low[:, used:], high[:, used:]
+        self.total, self.count = total[:, used:], count[used:]
+        if not groups:
+            return None
+
+        channels = low.shape[0]
+        t = t[:used:self.ratio]
+        low = low[:, :used].reshape(channels, groups, self.ratio).min(axis=2)
+        high = high[:, :used].reshape(channels, groups, self.ratio).max(axis=2)
+        total = total[:, :used].reshape(channels, groups, self.ratio).sum(axis=2)
+        count = count[:used].reshape(groups, self.ratio).sum(axis=1)
+
+        records = numpy.empty(groups, dtype=self.dtype)
+        records["t"] = t
+        records["min"] = low.T
+        records["max"] = high.T
+        records["mean"] = (total / count).T
+        self.file.write(records.tobytes())
+        return t, low, high, total, count
+
+    def close(self):
+        # El último grupo incompleto se descarta: los niveles solo tienen grupos completos
+        self.file.close()
+
+
+class PyramidWriter:
+    """Construye los niveles de una grabación bloque a bloque."""
+
+    def __init__(self, path, channels, sampling_rate, start, factors=FACTORS):
+        factors = sorted(factors)
+        header = {"channels": list(channels), "sampling_rate": sampling_rate, "start": start}
+        self.levels = [Level(level_path(path, factor), factor, factor // previous, header)
+                       for previous, factor in zip([1] + factors[:-1], factors)]
+
+    def write(self, timestamps, data):
+        """Añade (muestras,) instantes y (canales, muestras) datos."""
+        items = (timestamps, data, data, data, numpy.ones(len(timestamps)))
+        for level in self.levels:
+            items = level.add(*items)
+            if items is None:
+                break
+
+    def flush(self):
+        for level in self.levels:
+            level.file.flush()
+
+    def close(self):
+        for level in self.levels:
+            level.close()
+
+
+def open_level(path):
+    """Cabecera y registros (memmap) de un fichero de nivel."""
+    with open(path, "rb") as file:
+        if file.readline() != MAGIC:
+            raise ValueError("Not a pyramid level: %s" % path)
+        header = json.loads(file.readline())
+        offset = file.tell()
+    dtype = record_dtype(len(header["channels"]))
+    count = (os.path.getsize(path) - offset) // dtype.itemsize
+    if not count:
+        return header, numpy.zeros(0, dtype=dtype)
+    return header, numpy.memmap(path, dtype=dtype, mode="r", offset=offset, shape=(count,))
+
+
+class Pyramid:
+    """Consultas sobre los niveles de una grabación."""
+
+    def __init__(self, path):
+        self.path = path
+        self.levels = {}
+        for factor in FACTORS:
+            if os.path.exists(level_path(path, factor)):
+                header, records = open_level(level_path(path, factor))
+                self.levels[factor] = records
+                self.channels = header["channels"]
+                self.sampling_rate = header["sampling_rate"]
+        if not self.levels:
+            raise ValueError("No pyramid for %s" % path)
+
+    def choose(self, start, end, width):
+        """Nivel más grueso que aún da al menos `width` registros en [start, end) (None = muestras)."""
+        samples = (end - start) * self.sampling_rate
+        for factor in sorted(self.levels, reverse=True):
+            if samples / factor >= width:
+                return factor
+        return None
+
+    def query(self, start, end, width):
+        """
+        Datos de [start, end) (s) para dibujar `width` píxeles.
+
+        Output: dict con factor, channels, t (registros,) y min, max y mean
+        (canales, registros). Con factor 1 son las muestras de la grabación.
+        """
+        factor = self.choose(start, end, width)
+        if factor is None and not self.path.endswith(".bin"):
+            # Leer un CSV entero para un zoom no compensa: se usa el nivel más fino
+            factor = min(self.levels)
+        if factor is None:
+            t, data = read_binary_range(self.path, start, end)
+            return {"factor": 1, "channels": self.channels, "t": t, "min": data, "max": data, "mean": data}
+
+        records = self.levels[factor]
+        first, last = numpy.searchsorted(records["t"], (start, end))
+        # Se incluye el registro que empieza antes de `start` y lo contiene
+        records = records[max(first - 1, 0):last]
+        return {
+            "factor": factor,
+            "channels": self.channels,
+            "t": numpy.array(records["t"]),
+            "min": numpy.array(records["min"]).T,
+            "max": numpy.array(records["max"]).T,
+            "mean": numpy.array(records["mean"]).T,
+        }
+
+
+def read_binary_range(path, start, end):
+    """Muestras de [start, end) de una grabación binaria saltando los bloques de fuera."""
+    with open(path, "rb") as file:
+        header = recordings.read_header(file)
+        n_channels = len(header["channels"])
+        rate = float(header["sampling_rate"])
+        times, chunks = [], []
+        while True:
+            head = file.read(recordings.BLOCK_HEADER.size)
+            if len(head) < recordings.BLOCK_HEADER.size:
+                break
+            t0, n = recordings.BLOCK_HEADER.unpack(head)
+            if t0 >= end:
+                break
+            if t0 + n / rate <= start:
+                file.seek(2 * n * n_channels, os.SEEK_CUR)
+                continue
+            raw = file.read(2 * n * n_channels)
+            if len(raw) < 2 * n * n_channels:
+                break
+            t = t0 + numpy.arange(n) / rate
+            keep = (t >= start) & (t < end)
+            times.append(t[keep])
+            chunks.append(numpy.frombuffer(raw, dtype="<i2").reshape(n, n_channels).T[:, keep].astype(float))
+    if not times:
+        return numpy.zeros(0), numpy.zeros((n_channels, 0))
+    return numpy.concatenate(times), numpy.concatenate(chunks, axis=1)
+
+
+def build(path, sampling_rate=1000, factors=FACTORS):
+    """Construye los niveles de una grabación ya terminada."""
+    header, chunks = recordings.iter_recording(path, sampling_rate)
+    writer = None
+    for timestamps, data in chunks:
+        if writer is None:
+            rate = header.get("sampling_rate", sampling_rate)
+            writer = PyramidWriter(path, header["channels"], rate, float(timestamps[0]), factors)
+        writer.write(timestamps, data)
+    if writer is not None:
+        writer.close()
+
+
+if __name__ == '__main__':
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pirámides min/max/media de las grabaciones")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build_parser = commands.add_parser("build", help="construye las pirámides de grabaciones existentes")
+    build_parser.add_argument("paths", nargs="+")
+    query_parser = commands.add_parser("query", help="muestra qué nivel se usaría para un intervalo")
+    query_parser.add_argument("path")
+    query_parser.add_argument("--start", type=float, help="instante inicial (s epoch), por defecto el principio")
+    query_parser.add_argument("--seconds", type=float, default=8 * 3600)
+    query_parser.add_argument("--width", type=int, default=1200)
+    args = parser.parse_args()
+
+    if args.command == "build":
+        for path in args.paths:
+            build(path)
+            print("Pirámide construida:", path)
+    else:
+        pyramid = Pyramid(args.path)
+        start = args.start
+        if start is None:
+            start = float(pyramid.levels[min(pyramid.levels)]["t"][0])
+        result = pyramid.query(start, start + args.seconds, args.width)
+        print(f"factor {result['factor']}: {len(result['t'])} registros x {len(result['channels'])} canales")
@@ -0,0 +1,103 @@
+"""
+Grabaciones en disco: formato binario (data_N.bin) y lectura de los CSV.
+
+El binario es mucho más compacto y rápido de escribir y leer que el CSV: una línea mágica,
+una línea de cabecera JSON (frecuencia de muestreo, canales, inicio) y a
+continuación un registro por bloque con el instante de la primera muestra
+(float64), el número de muestras (uint32) y las muestras como int16
+little-endian intercaladas por muestra (muestra 0: A0 A1 ..., muestra 1: ...).
+
+También lee los CSV de siempre (data_N.csv) con la misma interfaz.
+"""
+
+import csv
+import itertools
+import json
+import struct
+from datetime import datetime
+
+import numpy
+
+MAGIC = b"BRXB1\n"
+BLOCK_HEADER = struct.Struct("<dI")
+
+
+def write_header(file, sampling_rate, channels, start):
+    file.write(MAGIC)
+    file.write((json.dumps({"sampling_rate": sampling_rate, "channels": list(channels), "start": start}) + "\n").encode())
+
+
+def write_block(file, t0, data):
+    """Escribe un bloque (canales, muestras) que empieza en t0 (s)."""
+    file.write(BLOCK_HEADER.pack(t0, data.shape[1]))
+    file.write(numpy.rint(data.T).astype("<i2").tobytes())
+
+
+def read_header(file):
+    if file.readline() != MAGIC:
+        raise ValueError("Not a binary recording: %s" % getattr(file, "name", file))
+    return json.loads(file.readline())
+
+
+def iter_binary(path):
+    """
+    Recorre una grabación binaria.
+
+    Output: cabecera (dict) y generador de (t0, bloque (canales, muestras))
+    """
+    file = open(path, "rb")
+    header = read_header(file)
+    n_channels = len(header["channels"])
+
+    def blocks():
+        with file:
+            while True:
+                head = file.read(BLOCK_HEADER.size)
+                if len(head) < BLOCK_HEADER.size:
+                    return
+                t0, n = BLOCK_HEADER.unpack(head)
+                raw = file.read(2 * n * n_channels)
+                if len(raw) < 2 * n * n_channels:
+                    # Último bloque incompleto (corte de corriente): se descarta
+                    return
+                yield t0, numpy.frombuffer(raw, dtype="<i2").reshape(n, n_channels).T.astype(float)
+
+    return header, blocks()
+
+
+def iter_csv(path, chunk_rows=10000):
+    """
+    Recorre una grabación CSV (Measurement, Timestamp, A0, ...) por trozos.
+
+    Output: cabecera (dict con 'channels') y generador de
+    (instantes (muestras,), trozo (canales, muestras))
+    """
+    file = open(path, newline='')
+    reader = csv.reader(file)
+    columns = next(reader)
+    header = {"channels": columns[2:]}
+
+    def chunks():
+        with file:
+            while True:
+                rows = list(itertools.islice(reader, chunk_rows))
+                if not rows:
+                    return
+                timestamps = numpy.array([datetime.fromisoformat(row[1]).timestamp() for row in rows])
+                data = numpy.array([row[2:] for row in rows], dtype=float).T
+                yield timestamps, data
+
+    return header, chunks()
+
+
+def iter_recording(path, sampling_rate=1000):
+    """
+    Recorre una grabación CSV o binaria con la misma interfaz.
+
+    Output: cabecera y generador de (instantes (muestras,), datos (canales, muestras))
+    """
+    if path.endswith(".bin"):
+        header, blocks = iter_binary(path)
+        rate = float(header.get("sampling_rate", sampling_rate))
+        return header, ((t0 + numpy.arange(data.shape[1]) / rate, data) for t0, data in blocks)
+    return iter_csv(path)
@@ -0,0 +1,145 @@
+"""
+Reproducción de sesiones grabadas como si vinieran del dispositivo.
+
+ReplaySource tiene la misma interfaz de bloques que BITalino.read, así que se
+puede poner en un Pipeline en lugar del BITalino. Lee grabaciones CSV
+(data_N.csv) o binarias (data_N.bin) en orden y respeta los instantes
+originales de cada muestra, escalados por `speed`: 1 es tiempo real, 10 es
+diez veces más rápido y 0 (o None) tan rápido como se pueda. Al acabar la
+grabación `read` lanza EOFError y el Pipeline termina normalmente.
+
+Uso:
+    source = ReplaySource(["data_1.csv", "data_2.csv"], speed=10)
+    pipeline = Pipeline(source, channels=source.analogChannels, ...)
+"""
+
+import time
+
+import numpy
+
+import recordings
+from pipeline import channel_index
+
+
+class ReplaySource:
+
+    def __init__(self, paths, speed=1.0, sampling_rate=1000):
+        self.paths = [paths] if isinstance(paths, str) else list(paths)
+        self.speed = speed
+        self.sampling_rate = sampling_rate
+        self.files = iter(self.paths)
+        self.chunks = iter(())
+        self.channel_names = None
+        self.pending_t = numpy.zeros(0)
+        self.pending = None
+        self.sequence = 0
+        self.wall_start = None
+        self.record_start = None
+        self.last_t0 = None
+        if not self.open_next_file():
+            raise ValueError("No recordings to replay")
+        self.analogChannels = [channel_index(name) for name in self.channel_names]
+
+    def open_next_file(self):
+        path = next(self.files, None)
+        if path is None:
+            return False
+        header, self.chunks = recordings.iter_recording(path, self.sampling_rate)
+        if self.channel_names is None:
+            self.channel_names = list(header["channels"])
+            self.pending = numpy.zeros((len(self.channel_names), 0))
+        elif list(header["channels"]) != self.channel_names:
+            raise ValueError("%s has channels %s, expected %s" % (path, header["channels"], self.channel_names))
+        return True
+
+    def next_chunk(self):
+        """Siguiente trozo de la grabación, pasando al siguiente fichero si hace falta."""
+        while True:
+            chunk = next(self.chunks, None)
+            if chunk is not None:
+                return chunk
+            if not self.open_next_file():
+                return None
+
+    def read(self, nSamples=100):
+        while self.pending.shape[1] < nSamples:
+            chunk = self.next_chunk()
+            if chunk is None:
+                break
+            timestamps, data = chunk
+            self.pending_t = numpy.concatenate((self.pending_t, timestamps))
+            self.pending = numpy.concatenate((self.pending, data), axis=1)
+        if not self.pending.shape[1]:
+            raise EOFError("End of recording")
+
+        n = min(nSamples, self.pending.shape[1])
+        timestamps, analog = self.pending_t[:n], self.pending[:, :n]
+        self.pending_t, self.pending = self.pending_t[n:], self.pending[:, n:]
+
+        # Misma organización que BITalino.read: secuencia, 4 digitales y los analógicos
+        block = numpy.zeros((5 + analog.shape[0], n))
+        block[0] = (self.sequence + numpy.arange(n)) % 16
+        block[5:] = analog
+        self.sequence = (self.sequence + n) % 16
+        self.last_t0 = float(timestamps[0])
+        self.wait_until(float(timestamps[-1]))
+        return block
+
+    def wait_until(self, timestamp):
+        """Duerme hasta que, a la velocidad elegida, le toque llegar a la muestra de `timestamp`."""
+        if not self.speed:
+            return
+        if self.wall_start is None:
+            self.wall_start = time.monotonic()
+            self.record_start = timestamp
+            return
+        delay = self.wall_start + (timestamp - self.record_start) / self.speed - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+
+    def start(self, analogChannels=None):
+        return True
+
+    def stop(self):
+        return True
+
+    def close(self):
+        return True
+
+
+if __name__ == '__main__':
+    import argparse
+
+    from detector import DetectorStage
+    from emg_filters import EMGFilterStage
+    from pipeline import Pipeline
+    from sinks import BinarySink, CsvSink, EventSink
+
+    parser = argparse.ArgumentParser(description="Reproduce sesiones grabadas por el pipeline")
+    parser.add_argument("paths", nargs="+", help="grabaciones CSV o binarias, en orden")
+    parser.add_argument("--speed", type=float, default=0, help="1 = tiempo real, 0 = lo más rápido posible")
+    parser.add_argument("--n-samples", type=int, default=1000)
+    parser.add_argument("--csv", help="prefijo para guardar de nuevo en CSV")
+    parser.add_argument("--binary", help="prefijo para guardar en binario")
+    parser.add_argument("--events", help="fichero JSON por líneas para los episodios detectados")
+    args = parser.parse_args()
+
+    source = ReplaySource(args.paths, args.speed)
+    names = source.channel_names
+    emg = [name for name in names if name in ("A0", "A1", "A2", "A3")]
+    sinks = []
+    if args.csv:
+        sinks.append(CsvSink(args.csv, names))
+    if args.binary:
+        sinks.append(BinarySink(args.binary, names))
+    sinks.append(EventSink(None, args.events))
+    pipeline = Pipeline(source, source.sampling_rate, args.n_samples, source.analogChannels,
+                        stages=[EMGFilterStage(emg, source.sampling_rate), DetectorStage(source.sampling_rate)],
+                        sinks=sinks)
+    start = time.perf_counter()
+    pipeline.start()
+    pipeline.join()
+    elapsed = time.perf_counter() - start
+    samples = pipeline.samples_processed
+    print(f"{pipeline.blocks_processed} bloques, {samples} muestras en {elapsed:.1f} s "
+          f"(~{samples / elapsed:.0f} muestras/s)")
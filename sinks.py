@@ -0,0 +1,256 @@
+"""
+Sumideros del pipeline: reciben cada bloque procesado con `write(block)` y
+se cierran con `close()` al parar la adquisición.
+"""
+
+import csv
+import os
+from datetime import datetime, timedelta
+
+import numpy
+
+import pyramid
+import recordings
+from pipeline import CHANNEL_NAMES, channel_index
+from thingsboard import save_json_to_file
+
+
+class CsvSink:
+    """
+    Guarda las muestras en data_N.csv con el mismo formato de siempre
+    (Measurement, Timestamp, A0..). Cambia de fichero cada `rotate`. Junto a
+    cada fichero construye su pirámide min/max/media (ver pyramid.py) con los
+    factores de `pyramid` (None para no hacerlo).
+    """
+
+    def __init__(self, prefix="data", channels=("A0", "A1", "A2", "A3"), rotate=timedelta(hours=1),
+                 pyramid=pyramid.FACTORS):
+        self.prefix = prefix
+        self.channels = list(channels)
+        self.analog_channels = self.channels
+        self.rotate = rotate
+        self.file_index = 0
+        self.file = None
+        self.writer = None
+        self.start_time = None
+        self.measurement_number = 1
+        self.pyramid_factors = pyramid
+        self.pyramid = None
+
+    def open_next(self, block):
+        self.close()
+        self.file_index += 1
+        # Tras un reinicio no se sobrescriben las grabaciones anteriores
+        while os.path.exists(f'{self.prefix}_{self.file_index}.csv'):
+            self.file_index += 1
+        self.file = open(f'{self.prefix}_{self.file_index}.csv', mode='w', newline='')
+        self.writer = csv.writer(self.file)
+        names = [CHANNEL_NAMES[channel_index(c)] for c in self.channels]
+        self.writer.writerow(["Measurement", "Timestamp"] + names)
+        if self.pyramid_factors:
+            self.pyramid = pyramid.PyramidWriter(self.file.name, names, block.sampling_rate, block.t0,
+                                                 self.pyramid_factors)
+        self.start_time = datetime.now()
+
+    def write(self, block):
+        # Check if an hour has passed and change the file if necessary
+        if self.file is None or datetime.now() - self.start_time >= self.rotate:
+            self.open_next(block)
+        analog = block.analog(self.channels)
+        values = analog.T.tolist()
+        numbers = range(self.measurement_number, self.measurement_number + len(block))
+        times = block.timestamps()
+        timestamps = [datetime.fromtimestamp(t).isoformat() for t in times]
+        self.writer.writerows([number, timestamp] + row for number, timestamp, row in zip(numbers, timestamps, values))
+        self.measurement_number += len(block)
+        self.file.flush()
+        if self.pyramid is not None:
+            self.pyramid.write(times, analog)
+            self.pyramid.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.pyramid is not None:
+            self.pyramid.close()
+            self.pyramid = None
+
+
+class BinarySink:
+    """
+    Guarda las muestras en data_N.bin (ver recordings.py): un registro por
+    bloque, int16 por muestra y canal. Cambia de fichero cada `rotate`. Como
+    CsvSink, construye la pirámide de cada fichero salvo con `pyramid` None.
+    """
+
+    def __init__(self, prefix="data", channels=("A0", "A1", "A2", "A3"), rotate=timedelta(hours=1),
+                 pyramid=pyramid.FACTORS):
+        self.prefix = prefix
+        self.channels = [CHANNEL_NAMES[channel_index(c)] for c in channels]
+        self.analog_channels = self.channels
+        self.rotate = rotate
+        self.file_index = 0
+        self.file = None
+        self.start_time = None
+        self.pyramid_factors = pyramid
+        self.pyramid = None
+
+    def open_next(self, block):
+        self.close()
+        self.file_index += 1
+        # Tras un reinicio no se sobrescriben las grabaciones anteriores
+        while os.path.exists(f'{self.prefix}_{self.file_index}.bin'):
+            self.file_index += 1
+        self.file = open(f'{self.prefix}_{self.file_index}.bin', mode='wb')
+        recordings.write_header(self.file, block.sampling_rate, self.channels, block.t0)
+        if self.pyramid_factors:
+            self.pyramid = pyramid.PyramidWriter(self.file.name, self.channels, block.sampling_rate, block.t0,
+                                                 self.pyramid_factors)
+        self.start_time = datetime.now()
+
+    def write(self, block):
+        if self.file is None or datetime.now() - self.start_time >= self.rotate:
+            self.open_next(block)
+        analog = block.analog(self.channels)
+        recordings.write_block(self.file, block.t0, analog)
+        self.file.flush()
+        if self.pyramid is not None:
+            self.pyramid.write(block.timestamps(), analog)
+            self.pyramid.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+        if self.pyramid is not None:
+            self.pyramid.close()
+            self.pyramid = None
+
+
+class TelemetrySink:
+    """
+    Encola en un Outbox la telemetría de cada bloque con su `ts` en ms.
+
+    Por defecto envía los canales en bruto; con `result` envía un resultado de
+    una etapa (p. ej. 'emg_envelope') con las claves terminadas en `suffix`,
+    solo de los canales de `channels` que haya filtrado EMGFilterStage.
+    Con `decimation` > 1 envía el máximo de cada grupo de `decimation` muestras;
+    los grupos siguen de un bloque al siguiente, así que el volumen no depende
+    del tamaño de bloque (que puede variar, ver adaptive.py).
+    """
+
+    def __init__(self, outbox, channels=("A0", "A1", "A2", "A3"), result=None, suffix="", decimation=1):
+        self.outbox = outbox
+        self.channels = list(channels)
+        self.result = result
+        # Con `result` los canales solo eligen filas del resultado (ver result_rows)
+        self.analog_channels = self.channels if result is None else []
+        self.names = [CHANNEL_NAMES[channel_index(c)] for c in self.channels]
+        self.suffix = suffix
+        self.decimation = decimation
+        # Muestras pendientes de completar un grupo de `decimation` (instantes, valores)
+        self.pending_ts = numpy.zeros(0)
+        self.pending = None
+
+    def write(self, block):
+        if self.result is None:
+            values = block.analog(self.channels)
+        else:
+            rows, self.names = self.result_rows(block)
+            values = block.results[self.result][rows]
+        ts = block.timestamps()
+        if self.decimation > 1:
+            if self.pending is not None:
+                ts = numpy.concatenate((self.pending_ts, ts))
+                values = numpy.concatenate((self.pending, values), axis=1)
+            groups = len(ts) // self.decimation
+            used = groups * self.decimation
+            self.pending_ts, self.pending = ts[used:], values[:, used:]
+            if not groups:
+                return
+            values = values[:, :used].reshape(values.shape[0], groups, self.decimation).max(axis=2)
+            ts = ts[:used:self.decimation]
+        self.send(ts, values)
+
+    def result_rows(self, block):
+        """Filas del resultado y nombre de su canal: las filas siguen `emg_channels`, no `channels`."""
+        filtered = [channel_index(c) for c in block.results["emg_channels"]]
+        wanted = [channel_index(c) for c in self.channels if channel_index(c) in filtered]
+        if not wanted:
+            raise ValueError("None of %s is in %r" % (self.channels, self.result))
+        return [filtered.index(c) for c in wanted], [CHANNEL_NAMES[c] for c in wanted]
+
+    def send(self, ts, values):
+        ts = (ts * 1000).astype(numpy.int64).tolist()
+        names = [name + self.suffix for name in self.names]
+        payload = [{"ts": t, "values": dict(zip(names, row))} for t, row in zip(ts, values.T.tolist())]
+        # Una entrada del outbox por bloque; OutboxUploader la sube como lista
+        self.outbox.put(payload)
+
+    def close(self):
+        # El último grupo incompleto también se envía
+        if self.pending is not None and self.pending.shape[1]:
+            self.send(self.pending_ts[:1], self.pending.max(axis=1, keepdims=True))
+        self.pending_ts, self.pending = numpy.zeros(0), None
+
+
+class EventSink:
+    """
+    Envía los eventos de `block.results['episodes']` (ver detector.py) al
+    Outbox como telemetría con el instante de inicio y, si se indica, los
+    añade también a un fichero JSON por líneas.
+    """
+
+    def __init__(self, outbox=None, filename=None):
+        self.outbox = outbox
+        self.filename = filename
+
+    def write(self, block):
+        self.write_results(block.results)
+
+    def write_results(self, results):
+        events = results.get("episodes")
+        if not events:
+            return
+        payload = []
+        for event in events:
+            if self.filename is not None:
+                save_json_to_file(event, self.filename)
+            if event["event"] == "onset":
+                values = {"episode_onset": 1}
+            else:
+                values = {
+                    "episode_duration": event["duration"],
+                    "episode_peak": event["peak"],
+                    "episode_bursts": event["bursts"],
+                    "episode_class": event["class"],
+                }
+                values.update({f"{name}_rms": rms for name, rms in event["rms"].items()})
+            payload.append({"ts": int(event["start"] * 1000), "values": values})
+        if self.outbox is not None:
+            self.outbox.put(payload)
+
+    def close(self):
+        pass
+
+
+class AnalysisSink:
+    """
+    Guarda en un fichero JSON por líneas los resultados de AnalysisStage
+    (`block.results['analysis']`), uno por bloque analizado, incluidos los que
+    la etapa entrega al cerrarse.
+    """
+
+    def __init__(self, filename="analysis.jsonl"):
+        self.filename = filename
+
+    def write(self, block):
+        self.write_results(block.results)
+
+    def write_results(self, results):
+        for seq, result, error in results.get("analysis") or ():
+            save_json_to_file({"block": seq, "result": result, "error": error}, self.filename)
+
+    def close(self):
+        pass
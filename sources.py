@@ -0,0 +1,84 @@
+"""
+Fuentes de bloques para el Pipeline (ver también replay.py).
+"""
+
+import time
+
+from pipeline import channel_index
+
+
+class BITalinoSource:
+    """
+    BITalino que se conecta al primer `read` y se reconecta solo si se pierde
+    la conexión, de modo que un corte de Bluetooth no para el pipeline ni
+    cierra los ficheros: solo se pierden las muestras del propio corte.
+    """
+
+    def __init__(self, mac_address, sampling_rate=1000, channels=(0, 1, 2, 3, 4, 5), battery_threshold=20,
+                 retry_delay=1.0):
+        self.mac_address = mac_address
+        self.sampling_rate = sampling_rate
+        self.analogChannels = sorted(set(channel_index(c) for c in channels))
+        self.battery_threshold = battery_threshold
+        self.retry_delay = retry_delay
+        self.device = None
+        self.closed = False
+        self.reconnections = 0
+
+    @property
+    def profile(self):
+        return self.device.profile if self.device is not None else None
+
+    @profile.setter
+    def profile(self, trace):
+        # Pipeline pone aquí la traza del bloque; BITalino.read la usa para medir lectura y decodificación
+        if self.device is not None:
+            self.device.profile = trace
+
+    def connect(self):
+        from bitalino import BITalino
+
+        device = BITalino()
+        if device.open(self.mac_address, self.sampling_rate) != True:
+            raise IOError("Cannot connect to %s" % self.mac_address)
+        device.battery(self.battery_threshold)
+        print("version: ", device.version())
+        device.start(self.analogChannels)
+        self.device = device
+
+    def disconnect(self):
+        device, self.device = self.device, None
+        if device is None:
+            return
+        try:
+            device.stop()
+            device.close()
+        except Exception:
+            pass
+
+    def read(self, nSamples=100):
+        while True:
+            if self.closed:
+                raise EOFError("Source closed")
+            try:
+                if self.device is None:
+                    self.connect()
+                return self.device.read(nSamples)
+            except Exception as e:
+                if self.closed:
+                    raise EOFError("Source closed")
+                print("Conexión perdida, reconectando:", e)
+                self.disconnect()
+                self.reconnections += 1
+                time.sleep(self.retry_delay)
+
+    def trigger(self, digitalArray=[0, 0, 0, 0]):
+        """BITalino.trigger sobre la conexión actual (falla si se está reconectando)."""
+        device = self.device
+        if device is None:
+            raise IOError("Not connected")
+        return device.trigger(digitalArray)
+
+    def close(self):
+        self.closed = True
+        self.disconnect()
@@ -0,0 +1,138 @@
+"""
+Características espectrales EMG en ventanas deslizantes, incrementales.
+
+Cada ventana de `window` muestras se estima con Welch: segmentos de `segment`
+muestras con solape `overlap`, ventana de Hann. Como los segmentos de Welch no
+dependen de la ventana a la que pertenecen, el periodograma de cada segmento
+se calcula una sola vez (una FFT por lotes para todos los canales y segmentos
+nuevos del bloque) y la PSD de cada ventana es la media de sus segmentos. El
+coste por segundo de señal es fijo, sea cual sea la duración de la sesión.
+
+En cada salto de `hop` muestras se emiten, por canal, frecuencia mediana,
+frecuencia media y potencia en cada banda.
+"""
+
+import numpy
+from numpy.lib.stride_tricks import sliding_window_view
+from scipy import signal
+
+from pipeline import CHANNEL_NAMES, channel_index
+
+DEFAULT_BANDS = {
+    "low": (20.0, 60.0),
+    "mid": (60.0, 150.0),
+    "high": (150.0, 450.0),
+}
+
+
+class SlidingSpectrum:
+
+    def __init__(self, n_channels, sampling_rate=1000, window=1000, hop=250, segment=250, overlap=0.5,
+                 bands=DEFAULT_BANDS):
+        self.sampling_rate = sampling_rate
+        self.segment = segment
+        self.step = int(segment * (1 - overlap))
+        if self.step <= 0 or hop % self.step or (window - segment) % self.step:
+            raise ValueError("hop and window - segment must be multiples of the segment step (%d)" % self.step)
+        self.per_window = (window - segment) // self.step + 1
+        self.per_hop = hop // self.step
+
+        # Ventana, escala y bandas se calculan una vez
+        self.taper = signal.get_window("hann", segment)
+        self.scale = 1.0 / (sampling_rate * (self.taper ** 2).sum())
+        self.freqs = numpy.fft.rfftfreq(segment, 1.0 / sampling_rate)
+        self.onesided = numpy.full(len(self.freqs), 2.0)
+        self.onesided[0] = 1.0
+        if segment % 2 == 0:
+            self.onesided[-1] = 1.0
+        self.df = self.freqs[1] - self.freqs[0]
+        self.band_names = list(bands)
+        self.band_matrix = numpy.array([(self.freqs >= lo) & (self.freqs < hi) for lo, hi in bands.values()],
+                                       dtype=float).T * self.df
+
+        self.pending = numpy.zeros((n_channels, 0))
+        self.history = numpy.zeros((n_channels, 0, len(self.freqs)))
+        self.segments = 0
+        self.t_origin = None
+
+    def periodograms(self, x):
+        """Periodogramas (canales, segmentos, frecuencias) de todos los segmentos completos de x."""
+        frames = sliding_window_view(x, self.segment, axis=1)[:, ::self.step]
+        frames = frames - frames.mean(axis=2, keepdims=True)
+        spectrum = numpy.fft.rfft(frames * self.taper, axis=2)
+        return (spectrum.real ** 2 + spectrum.imag ** 2) * self.scale * self.onesided
+
+    def process(self, x, t0):
+        """
+        Añade un bloque (canales, muestras) que empieza en t0 (s).
+
+        Output: dict con 't' (fin de cada ventana emitida), 'median_freq' y
+        'mean_freq' (canales, ventanas) y 'band_power' {banda: (canales, ventanas)};
+        None si el bloque no completa ninguna ventana
+        """
+        if self.t_origin is None:
+            self.t_origin = t0
+        x = numpy.concatenate((self.pending, numpy.asarray(x, dtype=float)), axis=1)
+        if x.shape[1] < self.segment:
+            self.pending = x
+            return None
+        psd = self.periodograms(x)
+        new = psd.shape[1]
+        self.pending = x[:, new * self.step:]
+
+        # Ventanas que terminan en alguno de los segmentos nuevos
+        before = self.segments
+        self.segments += new
+        counts = numpy.arange(before + 1, self.segments + 1)
+        counts = counts[(counts >= self.per_window) & ((counts - self.per_window) % self.per_hop == 0)]
+        history = numpy.concatenate((self.history, psd), axis=1)
+        first = before - self.history.shape[1]
+        self.history = history[:, -(self.per_window - 1):] if self.per_window > 1 else history[:, :0]
+        if not len(counts):
+            return None
+
+        cumulative = numpy.concatenate((numpy.zeros(history[:, :1].shape), numpy.cumsum(history, axis=1)), axis=1)
+        ends = counts - first
+        windows = (cumulative[:, ends] - cumulative[:, ends - self.per_window]) / self.per_window
+
+        total = windows.sum(axis=2)
+        mean_freq = (windows * self.freqs).sum(axis=2) / numpy.maximum(total, 1e-20)
+        half = numpy.cumsum(windows, axis=2) >= total[..., numpy.newaxis] / 2
+        median_freq = self.freqs[half.argmax(axis=2)]
+        band_power = windows @ self.band_matrix
+        t = self.t_origin + ((counts - 1) * self.step + self.segment) / float(self.sampling_rate)
+        return {
+            "t": t,
+            "median_freq": median_freq,
+            "mean_freq": mean_freq,
+            "band_power": {name: band_power[..., i] for i, name in enumerate(self.band_names)},
+        }
+
+
+class SpectralStage:
+    """
+    Etapa del pipeline que deja en `block.results['spectral']` las
+    características de las ventanas completadas en el bloque (o None). Usa la
+    señal de EMGFilterStage de los canales que haya filtrado y los canales en
+    bruto para el resto.
+    """
+
+    def __init__(self, channels=("A0", "A1", "A2", "A3"), sampling_rate=1000, source="emg_filtered", **kwargs):
+        self.channels = [CHANNEL_NAMES[channel_index(c)] for c in channels]
+        self.source = source
+        self.analog_channels = self.channels
+        self.spectrum = SlidingSpectrum(len(self.channels), sampling_rate, **kwargs)
+
+    def process(self, block):
+        if self.source in block.results:
+            # Las filas del resultado siguen los canales de EMGFilterStage, no los de esta etapa
+            filtered = [channel_index(c) for c in block.results["emg_channels"]]
+            result = block.results[self.source]
+            x = numpy.vstack([result[filtered.index(channel_index(c))] if channel_index(c) in filtered
+                              else block.analog([c])[0] for c in self.channels])
+        else:
+            x = block.analog(self.channels)
+        features = self.spectrum.process(x, block.t0)
+        if features is not None:
+            features["channels"] = self.channels
+        block.results["spectral"] = features
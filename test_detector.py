@@ -0,0 +1,42 @@
+import numpy
+
+from detector import BruxismDetector
+
+FS = 1000
+
+
+def block(values):
+    envelope = numpy.asarray(values, dtype=float)[None, :]
+    return envelope, envelope.copy()
+
+
+def rest(n, rng):
+    return 1.0 + 0.1 * rng.standard_normal(n)
+
+
+def test_burst_ending_on_block_boundary():
+    rng = numpy.random.default_rng(0)
+    detector = BruxismDetector(FS, ("A0",), merge_gap=1.0)
+    events = detector.process_envelope(0.0, *block(rest(FS, rng)))
+    # El segundo bloque acaba en plena ráfaga y el tercero empieza en reposo
+    events += detector.process_envelope(1.0, *block(numpy.concatenate((rest(500, rng), numpy.full(500, 50.0)))))
+    events += detector.process_envelope(2.0, *block(rest(FS, rng)))
+    events += detector.process_envelope(3.0, *block(rest(FS, rng)))
+
+    episodes = [e for e in events if e["event"] == "episode"]
+    assert [e["event"] for e in events] == ["onset", "episode"]
+    assert episodes[0]["start"] == 1.5
+    assert episodes[0]["end"] == 2.0
+    assert episodes[0]["bursts"] == 1
+
+
+def test_flush_closes_open_episode():
+    rng = numpy.random.default_rng(1)
+    detector = BruxismDetector(FS, ("A0",))
+    detector.process_envelope(0.0, *block(rest(FS, rng)))
+    detector.process_envelope(1.0, *block(numpy.concatenate((rest(500, rng), numpy.full(500, 50.0)))))
+
+    events = detector.flush(2.0)
+    assert [e["event"] for e in events] == ["episode"]
+    assert events[0]["duration"] == 0.5
+    assert detector.flush(2.0) == []
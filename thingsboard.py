@@ -1,20 +1,30 @@
 import json
-import requests
+import os
 
-def send_data_to_thingsboard(telemetry_data, device_token):
-    thingsboard_url = f"http://rt.ugr.es:8953/api/v1/{device_token}/telemetry"
-    
-    print("Enviando datos:", telemetry_data)
+# URL base de ThingsBoard; se puede cambiar con la variable de entorno THINGSBOARD_URL
+# (por ejemplo para apuntar a mock_thingsboard.py en pruebas de carga)
+THINGSBOARD_URL = os.environ.get("THINGSBOARD_URL", "http://rt.ugr.es:8953")
+
+def send_data_to_thingsboard(telemetry_data, device_token, timeout=10, base_url=None, verbose=True):
+    thingsboard_url = f"{base_url or THINGSBOARD_URL}/api/v1/{device_token}/telemetry"
+
+    if verbose:
+        print("Enviando datos:", telemetry_data)
 
     try:
+        # Import diferido: requests solo se carga si de verdad se sube algo
+        import requests
         headers = {
             "Content-Type": "application/json",
             "X-Authorization": f"Bearer {device_token}"
         }
-        response = requests.post(thingsboard_url, headers=headers, json=telemetry_data)
+        response = requests.post(thingsboard_url, headers=headers, json=telemetry_data, timeout=timeout)
         #print("Data posted to ThingsBoard:", response.text)
+        # Solo una respuesta 2xx confirma que ThingsBoard ha guardado los datos
+        return 200 <= response.status_code < 300
     except Exception as e:
         print("Exception:", e)
+        return False
 
 def save_json_to_file(telemetry_data, filename="data.json"):
     with open(filename, "a") as file: